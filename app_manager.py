@@ -74,6 +74,377 @@ def celery():
     worker.run()
 
 
+@manager.option('-p', dest='port', required=False, type=int, default=8090, help='Port')
+def recaptcha_stub(port):
+    """
+    Run a local reCAPTCHA siteverify server, set RECAPTCHA_VERIFY_URL to
+    http://localhost:8090/recaptcha/api/siteverify to use it.
+    """
+    from project.modules.recaptcha import create_stub_app
+    create_stub_app().run(host='0.0.0.0', port=port)
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+@manager.option('-o', dest='output', required=True, help='Archive file')
+@manager.option('-c', dest='contest_id', required=True, help='Contest id')
+def export_contest(contest_id, output, config_file=None):
+    """
+    Export a contest with its problems, testcases, submissions and result into one archive.
+    """
+    create_app(config_file=config_file and os.path.abspath(config_file))
+    from project.modules.contest_archive import ContestExporter
+    with open(output, 'wb') as f:
+        ContestExporter(contest_id).write(f)
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+@manager.option(dest='archive', help='Archive file')
+def import_contest(archive, config_file=None):
+    """
+    Import a contest archive made by export_contest.
+    """
+    create_app(config_file=config_file and os.path.abspath(config_file))
+    from project.modules.contest_archive import ContestImporter
+    contest_id = ContestImporter(archive).run()
+    print 'Contest %s imported' % contest_id
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+def pack_submissions(config_file=None):
+    """
+    Pack judged codes of contests ended before SUBMISSION_PACK_AFTER seconds.
+    """
+    app = create_app(config_file=config_file and os.path.abspath(config_file))
+    from project.modules.datetime import utcnowts
+    from project.models.contest import Contest
+    from project.models.submission import Submission
+    ends_before = utcnowts() - app.config['SUBMISSION_PACK_AFTER']
+    for contest_obj in Contest.objects(ends_at__lt=ends_before).only('name'):
+        packed = Submission.pack_contest(contest_obj.pk)
+        if packed is None:
+            print '%s: skipped, packed by another process' % contest_obj.name
+        elif packed:
+            print '%s: %d codes packed' % (contest_obj.name, packed)
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+def rebuild_memberships(config_file=None):
+    """
+    Rebuild the membership index from teams of all contests.
+    """
+    create_app(config_file=config_file and os.path.abspath(config_file))
+    from project.models.membership import Membership
+    print '%d memberships' % Membership.rebuild()
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+@manager.option('-n', dest='dry_run', required=False, action='store_true', help='Only print the indexes')
+def drop_redundant_indexes(dry_run=False, config_file=None):
+    """
+    Drop indexes which aren't declared anymore and are a prefix of a declared compound index.
+    """
+    create_app(config_file=config_file and os.path.abspath(config_file))
+    from project.models.user import User
+    from project.models.team import Team
+    from project.models.contest import Contest, Problem, Result
+    from project.models.submission import Submission
+    from project.models.membership import Membership
+    for model in [User, Team, Contest, Problem, Result, Submission, Membership]:
+        collection = model._get_collection()
+        declared = [[(f, int(d)) for f, d in spec['fields']] for spec in model._meta['index_specs']]
+        for name, info in sorted(collection.index_information().items()):
+            key = [(f, int(d)) for f, d in info['key']]
+            if name == '_id_' or info.get('unique') or key in declared:
+                continue
+            if not any(fields[:len(key)] == key for fields in declared):
+                print '%s: %s is not declared, kept' % (collection.name, name)
+                continue
+            if not dry_run:
+                collection.drop_index(name)
+            print '%s: %s %s' % (collection.name, name, 'is redundant' if dry_run else 'dropped')
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+@manager.option('-n', dest='number', required=False, type=int, default=20, help='Number of hashes')
+@manager.option('-r', dest='rounds', required=False, type=int, help='Rounds (default is PASSWORD_ROUNDS)')
+def benchmark_password(number, rounds=None, config_file=None):
+    """
+    Measure hashing and verification time of PASSWORD_SCHEMES to choose PASSWORD_ROUNDS.
+    """
+    app = create_app(config_file=config_file and os.path.abspath(config_file))
+    import time
+    from project.modules.hasher import PasswordHasher
+    for scheme in app.config['PASSWORD_SCHEMES']:
+        r = rounds or app.config['PASSWORD_ROUNDS'].get(scheme)
+        context = PasswordHasher.make_context([scheme], {scheme: r} if r else {})
+        started = time.time()
+        hashes = [context.encrypt('baby123') for i in xrange(number)]
+        hashed = time.time()
+        for h in hashes:
+            context.verify('baby123', h)
+        verified = time.time()
+        print '%s (rounds=%s): hash %.1f ms, verify %.1f ms, %.1f logins/s per core' % (
+            scheme, r or 'default',
+            (hashed - started) * 1000 / number,
+            (verified - hashed) * 1000 / number,
+            number / (verified - hashed))
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+@manager.option('-n', dest='number', required=False, type=int, default=100, help='Number of encodings')
+@manager.option('-c', dest='contest_id', required=False, help='Contest id (default is a generated payload)')
+def benchmark_json(number, contest_id=None, config_file=None):
+    """
+    Compare JSON encoders on the result and submissions of a contest.
+    """
+    app = create_app(config_file=config_file and os.path.abspath(config_file))
+    import json
+    import time
+    from project.modules import fastjson
+
+    if contest_id:
+        from project.models.contest import Contest
+        from project.models.submission import Submission, SubmissionSerializer
+        contest_obj = Contest.objects.get(pk=contest_id)
+        submissions = Submission.objects(contest=contest_obj).order_by('-submitted_at')
+        payloads = [
+            ('result', contest_obj.to_json_result()),
+            ('submissions', dict(submissions=SubmissionSerializer().dump_query(submissions)))
+        ]
+    else:
+        problems = dict(('p%d' % p, dict(submitted_at=1500000000, failed_tries=2, penalty=80, solved=True)) for p in range(12))
+        teams = dict(('t%d' % t, dict(problems=problems, solved_count=12, penalty=960)) for t in range(300))
+        payloads = [('result', dict(result=teams, teams=[dict(id=t, name=t) for t in teams]))]
+
+    encoders = [
+        ('flask', lambda obj: json.dumps(obj, indent=2, sort_keys=True)),
+        ('json', lambda obj: fastjson.dumps(obj, 'json'))
+    ]
+    if fastjson.ujson:
+        encoders.append(('ujson', lambda obj: fastjson.dumps(obj, 'ujson')))
+
+    with app.app_context():
+        for name, payload in payloads:
+            for encoder, dumps in encoders:
+                started = time.time()
+                for i in xrange(number):
+                    data = dumps(payload)
+                elapsed = time.time() - started
+                print '%s/%s: %.2f ms, %d bytes' % (name, encoder, elapsed * 1000 / number, len(data))
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+@manager.option('-n', dest='number', required=False, type=int, default=10000, help='Requests of each payload')
+def benchmark_validator(number, config_file=None):
+    """
+    Show the validation cost per request of valid and invalid payloads of
+    the create contest, create team and signup schemas (recaptcha is off).
+    """
+    app = create_app(config_file=config_file and os.path.abspath(config_file))
+    import json
+    import time
+    from werkzeug.exceptions import HTTPException
+    from project.extensions import validator, recaptcha
+
+    recaptcha.enabled = False
+    payloads = [
+        ('api_1.contest.create_schema', 'valid', dict(name=u'contest', starts_at=1500000000, ends_at=1500003600, recaptcha=u'x')),
+        ('api_1.contest.create_schema', 'invalid', dict(name=u'', starts_at=u'now')),
+        ('api_1.team.create_schema', 'valid', dict(name=u'team', members=[u'user1', u'user2'])),
+        ('api_1.team.create_schema', 'invalid', dict(members=[1, u'user2', 3])),
+        ('api_1.user.signup_schema', 'valid', dict(username=u'user', email=u'user@ijust.ir', password=u'baby123', recaptcha=u'x')),
+        ('api_1.user.signup_schema', 'invalid', dict(username=u'us er', email=u'user', password=u'12'))
+    ]
+
+    # request.json is parsed once per context, as the views read it anyway
+    view = lambda: ''
+    for name, kind, payload in payloads:
+        decorated = validator.validate_schema(name)(view)
+        with app.test_request_context(method='POST', data=json.dumps(payload), content_type='application/json'):
+            started = time.time()
+            for i in xrange(number):
+                try:
+                    decorated()
+                except HTTPException:
+                    pass
+            cost = (time.time() - started) * 1000000 / number
+        print '%s (%s): %.1f us per request' % (name, kind, cost)
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+@manager.option('-l', dest='languages', required=False, help='Languages, e.g. Cpp,Python27 (default is all)')
+@manager.option('-c', dest='cases', required=False, help='Cases of hello,cpu,memory,output (default is all)')
+@manager.option('-n', dest='repeat', required=False, type=int, default=3, help='Runs of each case')
+@manager.option('-t', dest='testcases', required=False, type=int, default=3, help='Testcases of each run')
+@manager.option('-s', dest='sandbox', required=False, help='docker or process (default is JUDGE_SANDBOX)')
+@manager.option('-o', dest='output', required=False, help='Append results to a json lines file')
+def benchmark_judge(repeat, testcases, languages=None, cases=None, sandbox=None, output=None, config_file=None):
+    """
+    Judge reference solutions of every language and show the time of starting
+    the sandbox, compiling, each testcase, checking and stopping.
+    """
+    app = create_app(config_file=config_file and os.path.abspath(config_file))
+    import json
+    from project.modules.ijudge.types import ProgrammingLanguageType
+    from project.modules.ijudge.benchmark import run_matrix
+
+    languages = languages and [ProgrammingLanguageType[l] for l in languages.split(',')]
+    cases = cases and cases.split(',')
+    results = run_matrix(languages, cases, repeat, testcases, sandbox or app.config['JUDGE_SANDBOX'])
+
+    f = output and open(output, 'a')
+    try:
+        for r in results:
+            print '%s/%s: %s, start %.2f s, compile %s, testcases %s, check %.3f s, stop %.2f s, total %.2f s' % (
+                r['language'], r['case'], r['status'], r.get('start', 0),
+                '%.2f s' % r['compile'] if 'compile' in r else '-',
+                ' '.join('%.2f' % t for t in r['testcases']) or '-',
+                r['check'], r['stop'], r['total'])
+            if f:
+                f.write(json.dumps(r, sort_keys=True) + '\n')
+    finally:
+        if f:
+            f.close()
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+@manager.option('-n', dest='number', required=False, type=int, default=5, help='Started processes')
+def startup_time(number, config_file=None):
+    """
+    Start the app in new processes and show the average time of each step
+    of create_app, like a uwsgi worker after max-requests or touch-reload.
+    """
+    import sys
+    import json
+    import subprocess
+    from collections import OrderedDict
+
+    script = (
+        'import sys, time, json\n'
+        'started = time.time()\n'
+        'from project.application import create_app\n'
+        'app = create_app(config_file=sys.argv[1] or None)\n'
+        'print json.dumps(app.startup_timings + [("total", time.time() - started)])\n'
+    )
+    config_file = config_file and os.path.abspath(config_file)
+    steps = OrderedDict()
+    for i in range(number):
+        output = subprocess.check_output(
+            [sys.executable, '-c', script, config_file or ''],
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        for step, seconds in json.loads(output.strip().splitlines()[-1]):
+            steps.setdefault(step, []).append(seconds)
+
+    for step, values in steps.items():
+        print '%-40s %8.1f ms' % (step, sum(values) * 1000 / len(values))
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+@manager.option('-r', dest='reset', required=False, action='store_true', help='Reset counters')
+def throttle_stats(reset=False, config_file=None):
+    """
+    Show hits and limited requests of each throttle rule.
+    """
+    create_app(config_file=config_file and os.path.abspath(config_file))
+    from project.extensions import throttle
+    for rule, counters in sorted(throttle.stats().items()):
+        limit, window = throttle.rules.get(rule, (None, None))
+        print '%s (%s per %ss): %d hits, %d limited' % (rule, limit, window, counters['hits'], counters['limited'])
+    if reset:
+        throttle.reset_stats()
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+@manager.option('-r', dest='reset', required=False, action='store_true', help='Reset counters')
+def cache_stats(reset=False, config_file=None):
+    """
+    Show hits and misses of the cached contest data.
+    """
+    create_app(config_file=config_file and os.path.abspath(config_file))
+    from project.modules import cached
+    for name, counters in sorted(cached.stats().items()):
+        total = counters['hits'] + counters['misses']
+        print '%s: %d hits, %d misses (%.1f%% hit rate)' % (
+            name, counters['hits'], counters['misses'],
+            100.0 * counters['hits'] / total if total else 0)
+    if reset:
+        cached.reset_stats()
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+@manager.option('-s', dest='scale', required=False, type=int, default=1, help='Seed scale (1 is 2000 users and 20000 submissions)')
+@manager.option('-k', dest='keep', required=False, action='store_true', help='Keep the seeded data')
+def audit_indexes(scale, keep=False, config_file=None):
+    """
+    Seed an empty database, explain the queries of the api routes and the judge,
+    and fail on collection scans, in memory sorts or queries examining too many
+    documents. Use a config with a scratch database.
+    """
+    import sys
+    from project.modules import index_audit
+    index_audit.register()
+    app = create_app(config_file=config_file and os.path.abspath(config_file))
+    from project.modules.seeder import Seeder
+
+    if not Seeder.is_empty():
+        print 'Database is not empty, use a config with a scratch database'
+        sys.exit(2)
+
+    try:
+        seeder = Seeder(scale, seed=0).run()
+        reports = index_audit.run(app, seeder.sample())
+    finally:
+        if not keep:
+            Seeder.clear()
+
+    failed = 0
+    for report in reports:
+        print '%s %s: %s, %d examined, %d returned' % (
+            'FAIL' if report['problems'] else 'ok  ', report['name'],
+            ' > '.join(report['stages']), report['examined'], report['returned'])
+        for message in report['problems']:
+            print '      %s' % message
+        if report['suggestion']:
+            print '      suggested index on %s: %r' % (report['collection'], report['suggestion'])
+        failed += bool(report['problems'])
+    print '%d of %d queries failed' % (failed, len(reports))
+    sys.exit(1 if failed else 0)
+
+
+@manager.option('-f', dest='config_file', required=False, help='Config file')
+@manager.option('-u', dest='url', required=False, default='http://localhost:8080', help='Server url')
+@manager.option('-s', dest='scale', required=False, type=int, default=1, help='Seed scale (1 is 2000 users and 20000 submissions)')
+@manager.option('-p', dest='profiles', required=False, default='login_storm,contest_start,submission_burst,scoreboard_polling', help='Traffic profiles')
+@manager.option('-c', dest='concurrency', required=False, type=int, default=20, help='Concurrent clients')
+@manager.option('-d', dest='duration', required=False, type=int, default=30, help='Seconds of scoreboard polling')
+@manager.option('-o', dest='output', required=False, help='Write the report as json')
+@manager.option('-b', dest='baseline', required=False, help='Fail on p95 regressions from a json report')
+@manager.option('-k', dest='keep', required=False, action='store_true', help='Keep the seeded data')
+def load_test(url, scale, profiles, concurrency, duration, output=None, baseline=None, keep=False, config_file=None):
+    """
+    Seed an empty database and run contest day traffic against a server using
+    the same database, then report p50/p95/p99 latencies per endpoint.
+    Run the server with THROTTLE_ENABLED off and JUDGE_FAKE on.
+    """
+    create_app(config_file=config_file and os.path.abspath(config_file))
+    import sys
+    from project.modules.seeder import Seeder
+    from tests import load
+
+    if not Seeder.is_empty():
+        print 'Database is not empty, use a config with a scratch database'
+        sys.exit(2)
+
+    try:
+        seeder = Seeder(scale, seed=0).run()
+        passed = load.run(url, seeder, profiles.split(','), concurrency, duration, output, baseline)
+    finally:
+        if not keep:
+            Seeder.clear()
+    sys.exit(0 if passed else 1)
+
+
 @manager.option('-r', dest='resource', required=False, help='Resource name')
 @manager.option('-u', dest='url', required=False, default='http://localhost:8080', help='Server url')
 def test(resource, url):
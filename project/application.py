@@ -3,23 +3,44 @@ __author__ = 'AminHP'
 
 # python imports
 import os
+import time
+from contextlib import contextmanager
 
 # flask imports
-from flask import Flask, jsonify
+from flask import Flask, request, g
 
 # project imports
 from config import DefaultConfig
+from project.modules.fastjson import jsonify
 
 
 def create_app(config_obj=DefaultConfig, config_file=None):
+    started = time.time()
     app = Flask(__name__)
-    configure_app(app, config_obj, config_file)
-    configure_extensions(app)
-    configure_errorhandlers(app)
-    install_app(app)
+    app.startup_timings = []
+    with timed(app, 'configure_app'):
+        configure_app(app, config_obj, config_file)
+    with timed(app, 'configure_extensions'):
+        configure_extensions(app)
+    with timed(app, 'configure_errorhandlers'):
+        configure_errorhandlers(app)
+    with timed(app, 'install_app'):
+        install_app(app)
+    app.logger.info('App created in %.0f ms' % ((time.time() - started) * 1000))
     return app
 
 
+@contextmanager
+def timed(app, step):
+    """
+    Appends (step, seconds) to app.startup_timings, steps inside others are
+    appended before them.
+    """
+    started = time.time()
+    yield
+    app.startup_timings.append((step, time.time() - started))
+
+
 def install_app(app):
     import flask
     import project
@@ -28,7 +49,8 @@ def install_app(app):
     project.app = app
     flask.current_app = app
     for module in controllers.__all__:
-        __import__('project.controllers.%s' % module)
+        with timed(app, 'controller %s' % module):
+            __import__('project.controllers.%s' % module)
 
 
 def configure_app(app, config_obj, config_file):
@@ -41,13 +63,19 @@ def configure_app(app, config_obj, config_file):
 
 
 def configure_extensions(app):
-    from project import extensions
+    with timed(app, 'import extensions'):
+        from project import extensions
+
+    # before the other extensions, to monitor the mongo clients they create
+    with timed(app, 'extension instrumentation'):
+        extensions.instrumentation.install(app)
 
     for extension in dir(extensions):
         try:
             attr = getattr(extensions, extension)
             if not isinstance(attr, type) and 'init_app' in dir(attr):
-                attr.init_app(app)
+                with timed(app, 'extension %s' % extension):
+                    attr.init_app(app)
         except AttributeError as e:
             print e
 
@@ -80,9 +108,18 @@ def configure_errorhandlers(app):
 
     @app.errorhandler(413)
     def entity_too_large(error):
-        desc = "Request entity too large. (max is 4mg)"
+        desc = "Request entity too large. (max is %s bytes)" % request.max_content_length
         return (jsonify(error=desc), 413) if app.config['DEBUG'] else ("", 413)
 
     @app.errorhandler(415)
     def unsupported_media_type(error):
         return (jsonify(error=error.description), 415) if app.config['DEBUG'] else ("", 415)
+
+    @app.errorhandler(429)
+    def too_many_requests(error):
+        headers = {'Retry-After': g.retry_after} if 'retry_after' in g else {}
+        return (jsonify(error=error.description), 429, headers) if app.config['DEBUG'] else ("", 429, headers)
+
+    @app.errorhandler(503)
+    def service_unavailable(error):
+        return (jsonify(error=error.description), 503) if app.config['DEBUG'] else ("", 503)
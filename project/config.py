@@ -15,6 +15,28 @@ class DefaultConfig(object):
     TESTING = True
     DEPLOYMENT = False
     TOKEN_EXPIRE_TIME = 5 * 3600
+    TOKEN_MODE = 'redis' # or 'signed' (verified without redis, logout goes to a revocation list)
+    TOKEN_SECRET_KEY = None # required in signed mode
+    TOKEN_REVOCATION_REFRESH = 5
+    USER_CACHE_TIMEOUT = 60
+    ADMIN_ENABLED = True # flask-admin views, off in api only workers for a faster startup
+    API_DOC_ENABLED = True # flasgger docs (/apidocs and /docs/api/*)
+
+    # password (new hashes use the first scheme, deprecated schemes and hashes below the minimum rounds are rehashed on login)
+
+    PASSWORD_SCHEMES = ['sha512_crypt', 'sha256_crypt']
+    PASSWORD_ROUNDS = {'sha512_crypt': 60000, 'sha256_crypt': 80000}
+    PASSWORD_MIN_ROUNDS = {'sha512_crypt': 60000, 'sha256_crypt': 80000}
+    PASSWORD_MAX_CONCURRENCY = None # simultaneous hash computations of the processes of one host, 'cpu' for the cpu count, None for no limit
+    PASSWORD_QUEUE_LENGTH = 32 # requests of one host waiting for a slot (about one hash time each per slot), more get 503
+
+    # throttle (rule: (max hits, window seconds))
+
+    THROTTLE_ENABLED = True
+    THROTTLE_RULES = {
+        'login_ip': (100, 60), # many contestants may share one ip
+        'login_account': (10, 60)
+    }
 
     # directory
 
@@ -23,10 +45,12 @@ class DefaultConfig(object):
     SCHEMA_DIR = os.path.join(BASE_DIR, 'schemas')
     DATA_DIR = os.path.join(BASE_DIR, '..', '..', 'Data')
     TEMP_DIR = os.path.join(DATA_DIR, 'Temp')
+    UPLOAD_DIR = os.path.join(TEMP_DIR, 'Uploads')
     MEDIA_DIR = os.path.join(DATA_DIR, 'Media')
     PROBLEM_DIR = os.path.join(MEDIA_DIR, 'Problems')
     TESTCASE_DIR = os.path.join(MEDIA_DIR, 'Testcases')
     SUBMISSION_DIR = os.path.join(MEDIA_DIR, 'Submissions')
+    SUBMISSION_PACK_DIR = os.path.join(MEDIA_DIR, 'SubmissionPacks')
 
     # form
 
@@ -36,10 +60,25 @@ class DefaultConfig(object):
     # upload
 
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+    UPLOAD_LIMITS = {
+        'api_1.submission.create': 256 * 1024,
+        'api_1.contest.problem_upload_body': 16 * 1024 * 1024,
+        'api_1.contest.problem_upload_testcase': 16 * 1024 * 1024
+    }
+
+    # submission packing (codes of contests ended before this many seconds are packed)
+
+    SUBMISSION_PACK_AFTER = 7 * 24 * 3600
 
     # pagination
 
     DEFAULT_PAGE_SIZE = 10
+    PAGINATION_TOTAL_CACHE_TIMEOUT = 60 # totals of cursor pagination are approximate
+
+    # json
+
+    JSON_ENCODER = 'auto' # 'ujson', 'json' or 'auto' (ujson if installed)
+    RESULT_CACHE_TIMEOUT = 60 # encoded results (tiered cache), also invalidated by new results
 
     # cache
 
@@ -48,6 +87,34 @@ class DefaultConfig(object):
     CACHE_THRESHOLD = 100
     CACHE_NO_NULL_WARNING = True
     CACHE_DIR = os.path.join(TEMP_DIR, 'Cache')
+    CONTEST_CACHE_TIMEOUT = 300 # contest info and problems, invalidated on changes
+    CACHE_STATS_FLUSH_INTERVAL = 10 # seconds hit and miss counts are kept in each process before adding them to redis
+
+    # tiered cache
+
+    TIERED_CACHE_ENABLED = True
+    TIERED_CACHE_LOCAL_SIZE = 256 # entries of the LRU of each process
+    TIERED_CACHE_LOCAL_TIMEOUT = 2 # seconds a value is served from the LRU without redis
+    TIERED_CACHE_STALE_TIMEOUT = 30 # seconds an expired value is served while it's rebuilt
+    TIERED_CACHE_LOCK_TIMEOUT = 10 # seconds a rebuild may take before another process tries
+    TIERED_CACHE_WAIT_TIMEOUT = 0.2 # seconds to wait for another process's rebuild before building too
+    TIERED_CACHE_BETA = 1.0 # early expiry, bigger values rebuild earlier
+
+    # judge
+
+    JUDGE_SANDBOX = 'docker' # or 'process', runs codes without isolation (CI without docker)
+    JUDGE_FAKE = False # random statuses without running codes, for load tests
+    JUDGE_FAKE_DELAY = (0.2, 1.5) # seconds range of a fake judgement
+
+    # instrumentation
+
+    INSTRUMENTATION_ENABLED = False # per endpoint stats (saved only with METRICS_TOKEN) and slow query logs, a redis pipeline per request
+    INSTRUMENTATION_SLOW_QUERY = 100 # ms, slower mongo commands are logged
+    INSTRUMENTATION_PROFILE_RATE = 0 # ratio of profiled requests (0 is off)
+    INSTRUMENTATION_PROFILE_THRESHOLD = 500 # ms, profiles of slower requests are saved
+    INSTRUMENTATION_PROFILE_DIR = os.path.join(TEMP_DIR, 'Profiles')
+    METRICS_TOKEN = None # Metrics-Token header (or bearer token) of /metrics routes (None is off)
+    METRICS_CELERY_QUEUES = ['celery'] # queues whose length is exported by /metrics
 
     # redis
 
@@ -71,6 +138,12 @@ class DefaultConfig(object):
     RECAPTCHA_ENABLED = False
     RECAPTCHA_SITE_KEY = "6LeDPwcTAAAAADVt4vp-kdTHXcbl76JbRFK3PUV5"
     RECAPTCHA_SECRET_KEY = "6LeDPwcTAAAAAKF5mXqJpKqo1NW2nntCrjyFwi3Q"
+    RECAPTCHA_VERIFY_URL = "https://www.google.com/recaptcha/api/siteverify"
+    RECAPTCHA_TIMEOUT = (1, 3) # connect, read
+    RECAPTCHA_FAIL_OPEN = False # accept captchas while google is unreachable
+    RECAPTCHA_BREAKER_THRESHOLD = 5 # consecutive failures which stop calling google
+    RECAPTCHA_BREAKER_RESET = 30
+    RECAPTCHA_CACHE_TIMEOUT = 60 # seconds used and wrong captchas are rejected without calling google
 
 
 class DevelopmentConfig(DefaultConfig):
@@ -108,6 +181,12 @@ class TestingConfig(DefaultConfig):
 
     DEBUG = True
     TESTING = True
+    TOKEN_MODE = 'signed' # the api tests cover the revocation list
+    TOKEN_SECRET_KEY = 'testing'
+
+    # upload (small, so the api tests reach it with short bodies)
+
+    UPLOAD_LIMITS = dict(DefaultConfig.UPLOAD_LIMITS, **{'api_1.submission.create': 2 * 1024})
 
     # cache
 
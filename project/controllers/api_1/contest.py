@@ -7,19 +7,22 @@ import shutil
 import zipfile
 import StringIO
 import base64
+from bson import ObjectId
 
 # flask imports
-from flask import jsonify, request, g, send_file, abort
+from flask import request, g, send_file, abort
 
 # project imports
 from project import app
-from project.extensions import db, auth
+from project.extensions import db, auth, upload
 from project.modules.datetime import utcnowts
 from project.modules.paginator import paginate
-from project.models.contest import Contest, Problem, ContestDateTimeError
+from project.models.contest import Contest, Problem, ContestDateTimeError, ContestSerializer, ContestUserSerializer
 from project.models.team import Team
+from project.models.membership import Membership
 from project.models.user import User
 from project.forms.problem import UploadProblemBody, UploadTestCase
+from project.modules.fastjson import jsonify, json_response
 
 
 @app.api_route('', methods=['POST'])
@@ -79,7 +82,7 @@ def create():
     json = request.json
     try:
         obj = Contest()
-        obj.owner = User.objects.get(pk=g.user_id)
+        obj.owner = g.user
         obj.populate(json)
         obj.save()
         return jsonify(obj.to_json()), 201
@@ -189,13 +192,14 @@ def info(cid):
         description: Contest does not exist
     """
 
-    try:
-        obj = Contest.objects.get(pk=cid)
-        user_obj = User.objects.get(pk=g.user_id)
-        return jsonify(obj.to_json_user(user_obj)), 200
-    except (db.DoesNotExist, db.ValidationError):
+    if not ObjectId.is_valid(cid):
         return abort(404, "Contest does not exist")
 
+    result = ContestUserSerializer(g.user.pk).dump_many([{'_id': ObjectId(cid)}])
+    if not result:
+        return abort(404, "Contest does not exist")
+    return jsonify(result[0]), 200
+
 
 @app.api_route('<string:cid>', methods=['PUT'])
 @app.api_validate('contest.edit_schema')
@@ -257,7 +261,7 @@ def edit(cid):
     json = request.json
     try:
         obj = Contest.objects.get(pk=cid)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if (user_obj != obj.owner) and (not user_obj in obj.admins):
             return abort(403, "You aren't owner or admin of the contest")
@@ -306,7 +310,7 @@ def delete(cid):
 
     try:
         obj = Contest.objects.get(pk=cid)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if user_obj != obj.owner:
             return abort(403, "You aren't owner of the contest")
@@ -318,7 +322,7 @@ def delete(cid):
 
 
 @app.api_route('', methods=['GET'])
-@paginate('contests', 20)
+@paginate('contests', 20, order=('-starts_at',))
 @auth.authenticate
 def list():
     """
@@ -337,6 +341,16 @@ def list():
         type: integer
         required: false
         description: Contest amount per page (default is 10)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Cursor from next_cursor or prev_cursor of meta (empty for the first page), used instead of page
+      - name: with_total
+        in: query
+        type: integer
+        required: false
+        description: Set 1 to get an approximate total in cursor mode
       - name: Access-Token
         in: header
         type: string
@@ -385,14 +399,13 @@ def list():
         description: Token is invalid or has expired
     """
 
-    user_obj = User.objects.get(pk=g.user_id)
+    user_obj = g.user
     contests = Contest.objects.order_by('-starts_at')
-    result_func = lambda obj: Contest.to_json_user(obj, user_obj)
-    return contests, result_func
+    return contests, ContestUserSerializer(user_obj.pk)
 
 
 @app.api_route('owner', methods=['GET'])
-@paginate('contests', 20)
+@paginate('contests', 20, order=('-starts_at',))
 @auth.authenticate
 def list_owner():
     """
@@ -411,6 +424,16 @@ def list_owner():
         type: integer
         required: false
         description: Contest amount per page (default is 10)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Cursor from next_cursor or prev_cursor of meta (empty for the first page), used instead of page
+      - name: with_total
+        in: query
+        type: integer
+        required: false
+        description: Set 1 to get an approximate total in cursor mode
       - name: Access-Token
         in: header
         type: string
@@ -473,10 +496,9 @@ def list_owner():
         description: Token is invalid or has expired
     """
 
-    user_obj = User.objects.get(pk=g.user_id)
+    user_obj = g.user
     contests = Contest.objects.filter(owner=user_obj).order_by('-starts_at')
-    result_func = lambda obj: Contest.to_json(obj)
-    return contests, result_func
+    return contests, ContestSerializer()
 
 
 @app.api_route('<string:cid>/result', methods=['GET'])
@@ -568,7 +590,7 @@ def result(cid):
 
     try:
         obj = Contest.objects.get(pk=cid)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
         now = utcnowts()
 
         if not (user_obj == obj.owner or user_obj in obj.admins or \
@@ -576,7 +598,7 @@ def result(cid):
                (now > obj.ends_at)):
             return abort(403, "You aren't allowed to see result")
 
-        return jsonify(obj.to_json_result()), 200
+        return json_response(obj.encoded_result(), 200)
     except (db.DoesNotExist, db.ValidationError):
         return abort(404, "Contest does not exist")
 
@@ -628,10 +650,9 @@ def list_team(tid):
 
     try:
         obj = Team.objects.get(pk=tid)
-        wc = Contest.objects.filter(pending_teams=obj)
-        wc = [c.to_json() for c in wc]
-        jc = Contest.objects.filter(accepted_teams=obj)
-        jc = [c.to_json() for c in jc]
+        serializer = ContestSerializer()
+        wc = serializer.dump_query(Contest.objects.filter(pending_teams=obj))
+        jc = serializer.dump_query(Contest.objects.filter(accepted_teams=obj))
 
         return jsonify(waiting_contests=wc, joined_contests=jc), 200
     except (db.DoesNotExist, db.ValidationError):
@@ -694,6 +715,7 @@ def team_join(cid):
             return abort(409, "You are already accepted")
 
         obj.update(add_to_set__pending_teams=team_obj)
+        Membership.sync(team_obj.pk, obj.pk)
         return '', 200
     except (db.DoesNotExist, db.ValidationError):
         return abort(404, "Contest or Team does not exist")
@@ -744,6 +766,7 @@ def team_unjoin(cid, tid):
             return abort(403, "You aren't owner of the team")
 
         obj.update(pull__pending_teams=team_obj)
+        Membership.sync(team_obj.pk, obj.pk)
         return '', 200
     except (db.DoesNotExist, db.ValidationError):
         return abort(404, "Contest or Team does not exist")
@@ -790,7 +813,7 @@ def team_list_pending(cid):
 
     try:
         obj = Contest.objects.get(pk=cid)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if (user_obj != obj.owner) and (not user_obj in obj.admins):
             return abort(403, "You aren't owner or admin of the contest")
@@ -834,7 +857,7 @@ def team_list_accepted(cid):
 
     try:
         obj = Contest.objects.get(pk=cid)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if (user_obj != obj.owner) and (not user_obj in obj.admins):
             return abort(403, "You aren't owner or admin of the contest")
@@ -882,12 +905,13 @@ def team_accept(cid, tid):
     try:
         team_obj = Team.objects.get(pk=tid)
         obj = Contest.objects.get(pk=cid, pending_teams=team_obj)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if (user_obj != obj.owner) and (not user_obj in obj.admins):
             return abort(403, "You aren't owner or admin of the contest")
 
         obj.update(pull__pending_teams=team_obj, add_to_set__accepted_teams=team_obj)
+        Membership.sync(team_obj.pk, obj.pk)
         return '', 200
     except (db.DoesNotExist, db.ValidationError):
         return abort(404, "Contest or Team does not exist")
@@ -931,12 +955,13 @@ def team_reject(cid, tid):
     try:
         team_obj = Team.objects.get(pk=tid)
         obj = Contest.objects.get(pk=cid, pending_teams=team_obj)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if (user_obj != obj.owner) and (not user_obj in obj.admins):
             return abort(403, "You aren't owner or admin of the contest")
 
         obj.update(pull__pending_teams=team_obj)
+        Membership.sync(team_obj.pk, obj.pk)
         return '', 200
     except (db.DoesNotExist, db.ValidationError):
         return abort(404, "Contest or Team does not exist")
@@ -980,12 +1005,13 @@ def team_kick(cid, tid):
     try:
         team_obj = Team.objects.get(pk=tid)
         obj = Contest.objects.get(pk=cid, accepted_teams=team_obj)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if (user_obj != obj.owner) and (not user_obj in obj.admins):
             return abort(403, "You aren't owner or admin of the contest")
 
         obj.update(pull__accepted_teams=team_obj)
+        Membership.sync(team_obj.pk, obj.pk)
         return '', 200
     except (db.DoesNotExist, db.ValidationError):
         return abort(404, "Contest or Team does not exist")
@@ -1061,7 +1087,7 @@ def problem_create(cid):
     json = request.json
     try:
         obj = Contest.objects.get(pk=cid)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if (user_obj != obj.owner) and (not user_obj in obj.admins):
             return abort(403, "You aren't owner or admin of the contest")
@@ -1130,20 +1156,20 @@ def problem_info(cid, pid):
         description: Contest or problem does not exist
     """
 
-    try:
-        problem_obj = Problem.objects.get(pk=pid)
-        obj = Contest.objects.get(pk=cid, problems=problem_obj)
-        user_obj = User.objects.get(pk=g.user_id)
-        now = utcnowts()
+    core = Contest.cached_core(cid)
+    if core is None:
+        return abort(404, "Contest or problem does not exist")
+    problems = Contest.cached_problems(core['json']['id'])
+    if not (problems and pid in [prob['id'] for prob in problems['problems']]):
+        return abort(404, "Contest or problem does not exist")
 
-        if not (user_obj == obj.owner or user_obj in obj.admins or \
-               (now >= obj.starts_at and obj.is_user_in_contest(user_obj)) or \
-               (now > obj.ends_at)):
-            return abort(403, "You aren't allowed to see problem")
+    if not Contest.core_allows(core, g.user):
+        return abort(403, "You aren't allowed to see problem")
 
-        return jsonify(problem_obj.to_json()), 200
-    except (db.DoesNotExist, db.ValidationError):
+    problem = Problem.cached_json(pid)
+    if problem is None:
         return abort(404, "Contest or problem does not exist")
+    return jsonify(problem), 200
 
 
 @app.api_route('<string:cid>/problem', methods=['GET'])
@@ -1193,19 +1219,17 @@ def problem_list(cid):
         description: Contest does not exist
     """
 
-    try:
-        obj = Contest.objects.get(pk=cid)
-        user_obj = User.objects.get(pk=g.user_id)
-        now = utcnowts()
+    core = Contest.cached_core(cid)
+    if core is None:
+        return abort(404, "Contest does not exist")
 
-        if not (user_obj == obj.owner or user_obj in obj.admins or \
-               (now >= obj.starts_at and obj.is_user_in_contest(user_obj)) or \
-               (now > obj.ends_at)):
-            return abort(403, "You aren't allowed to see problems")
+    if not Contest.core_allows(core, g.user):
+        return abort(403, "You aren't allowed to see problems")
 
-        return jsonify(obj.to_json_problems()), 200
-    except (db.DoesNotExist, db.ValidationError):
+    problems = Contest.cached_problems(core['json']['id'])
+    if problems is None:
         return abort(404, "Contest does not exist")
+    return jsonify(problems), 200
 
 
 @app.api_route('<string:cid>/problem/<string:pid>', methods=['PUT'])
@@ -1274,7 +1298,7 @@ def problem_edit(cid, pid):
     try:
         problem_obj = Problem.objects.get(pk=pid)
         obj = Contest.objects.get(pk=cid, problems=problem_obj)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if (user_obj != obj.owner) and (not user_obj in obj.admins):
             return abort(403, "You aren't owner or admin of the contest")
@@ -1341,7 +1365,7 @@ def problem_change_order(cid):
     json = request.json
     try:
         obj = Contest.objects.get(pk=cid)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if (user_obj != obj.owner) and (not user_obj in obj.admins):
             return abort(403, "You aren't owner or admin of the contest")
@@ -1403,7 +1427,7 @@ def problem_delete(cid, pid):
     try:
         problem_obj = Problem.objects.get(pk=pid)
         obj = Contest.objects.get(pk=cid, problems=problem_obj)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if (user_obj != obj.owner) and (not user_obj in obj.admins):
             return abort(403, "You aren't owner or admin of the contest")
@@ -1464,7 +1488,7 @@ def problem_upload_body(cid, pid):
     try:
         problem_obj = Problem.objects.get(pk=pid)
         obj = Contest.objects.get(pk=cid, problems=problem_obj)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if (user_obj != obj.owner) and (not user_obj in obj.admins):
             return abort(403, "You aren't owner or admin of the contest")
@@ -1476,8 +1500,7 @@ def problem_upload_body(cid, pid):
         if not form.validate_file():
             return abort(415, "Supported file type is only application/pdf")
 
-        file_obj = form.body.data
-        file_obj.save(problem_obj.body_path)
+        upload.save(form.body.data, problem_obj.body_path)
 
         return "", 200
     except (db.DoesNotExist, db.ValidationError):
@@ -1533,7 +1556,7 @@ def problem_upload_testcase(cid, pid):
     try:
         problem_obj = Problem.objects.get(pk=pid)
         obj = Contest.objects.get(pk=cid, problems=problem_obj)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if (user_obj != obj.owner) and (not user_obj in obj.admins):
             return abort(403, "You aren't owner or admin of the contest")
@@ -1595,7 +1618,7 @@ def problem_download_body(cid, pid):
     try:
         problem_obj = Problem.objects.get(pk=pid)
         obj = Contest.objects.get(pk=cid, problems=problem_obj)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
         now = utcnowts()
 
         if not (user_obj == obj.owner or user_obj in obj.admins or \
@@ -1781,7 +1804,7 @@ def admin_list(cid):
 
 
 @app.api_route('admin', methods=['GET'])
-@paginate('contests', 20)
+@paginate('contests', 20, order=('-starts_at',))
 @auth.authenticate
 def admin_contests():
     """
@@ -1800,6 +1823,16 @@ def admin_contests():
         type: integer
         required: false
         description: Contest amount per page (default is 10)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Cursor from next_cursor or prev_cursor of meta (empty for the first page), used instead of page
+      - name: with_total
+        in: query
+        type: integer
+        required: false
+        description: Set 1 to get an approximate total in cursor mode
       - name: Access-Token
         in: header
         type: string
@@ -1814,7 +1847,6 @@ def admin_contests():
         description: Token is invalid or has expired
     """
 
-    user_obj = User.objects.get(pk=g.user_id)
+    user_obj = g.user
     contests = Contest.objects.filter(admins=user_obj).order_by('-starts_at')
-    result_func = lambda obj: Contest.to_json(obj)
-    return contests, result_func
+    return contests, ContestSerializer()
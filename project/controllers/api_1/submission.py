@@ -2,20 +2,23 @@
 __author__ = ['AminHP', 'SALAR']
 
 # python imports
-import os
+import time
+from bson import ObjectId
+from functools import partial
 
 # flask imports
-from flask import jsonify, g, send_file, abort
+from flask import request, g, send_file, abort, Response, stream_with_context
 
 # project imports
 from project import app
-from project.extensions import db, auth
+from project.extensions import db, auth, metrics
 from project.modules.datetime import utcnowts
 from project.modules import ijudge
-from project.models.submission import Submission, JudgementStatusType
+from project.modules.zipstream import iter_zip
+from project.modules.paginator import paginate
+from project.models.submission import Submission, SubmissionSerializer, JudgementStatusType
 from project.models.contest import Problem, Contest
 from project.models.team import Team
-from project.models.user import User
 from project.forms.submission import UploadCode
 from project.extensions import celery
 
@@ -53,7 +56,7 @@ def create():
         in: formData
         type: file
         required: true
-        description: Code file (max size is 16M)
+        description: Code file (max size is 256K)
       - name: Access-Token
         in: header
         type: string
@@ -75,7 +78,7 @@ def create():
         description: (Contest has not started or has been finished)
                      (You have too many pending submissions)
       413:
-        description: Request entity too large. (max size is 16M)
+        description: Request entity too large. (max size is 256K)
       415:
         description: Supported file type is only text/plain
     """
@@ -91,7 +94,7 @@ def create():
         json = form.to_json()
         tid = json['team_id']
 
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
         problem_obj = Problem.objects.get(pk=json['problem_id'])
 
         if not tid:
@@ -122,15 +125,10 @@ def create():
         obj.problem = problem_obj
         obj.team = team_obj if tid else None
         obj.user = user_obj
+        obj.save_code(form.code.data)
         obj.save()
 
-        file_obj = form.code.data
-        directory = os.path.dirname(obj.code_path)
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-        file_obj.save(obj.code_path)
-
-        check_code_task.delay(str(obj.pk), False if tid else True)
+        check_code_task.delay(str(obj.pk), False if tid else True, enqueued_at=time.time())
 
         return "", 201
     except (db.DoesNotExist, db.ValidationError):
@@ -139,6 +137,7 @@ def create():
 
 @app.api_route('contest/<string:cid>', methods=['GET'])
 @app.api_route('contest/<string:cid>/team/<string:tid>', methods=['GET'])
+@paginate('submissions', 100, order=('-submitted_at',), ndjson=True)
 @auth.authenticate
 def list(cid, tid=None):
     """
@@ -157,6 +156,41 @@ def list(cid, tid=None):
         type: string
         required: false
         description: Id of team
+      - name: problem_id
+        in: query
+        type: string
+        required: false
+        description: Filter by problem
+      - name: team_id
+        in: query
+        type: string
+        required: false
+        description: Filter by team (when tid isn't given)
+      - name: status
+        in: query
+        type: string
+        required: false
+        description: Filter by status name (e.g. Accepted)
+      - name: page
+        in: query
+        type: integer
+        required: false
+        description: Page number
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+        description: Submission amount per page (default is 10)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Cursor from next_cursor or prev_cursor of meta (empty for the first page), used instead of page
+      - name: format
+        in: query
+        type: string
+        required: false
+        description: Set ndjson to stream all submissions as newline delimited json
       - name: Access-Token
         in: header
         type: string
@@ -206,7 +240,7 @@ def list(cid, tid=None):
     """
 
     try:
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
         if not tid:
             contest_obj = Contest.objects.get(pk=cid)
             if (user_obj != contest_obj.owner) and (not user_obj in contest_obj.admins):
@@ -214,6 +248,7 @@ def list(cid, tid=None):
             submissions = Submission.objects.filter(
                 contest=contest_obj,
             ).order_by('-submitted_at')
+            submissions = filter_submissions(submissions, 'problem_id', 'team_id')
 
         else:
             team_obj = Team.objects.get(pk=tid)
@@ -224,9 +259,9 @@ def list(cid, tid=None):
                 contest=contest_obj,
                 team=team_obj if tid else None
             ).order_by('-submitted_at')
+            submissions = filter_submissions(submissions, 'problem_id')
 
-        submissions = [s.to_json() for s in submissions]
-        return jsonify(submissions=submissions), 200
+        return submissions, SubmissionSerializer()
 
     except (db.DoesNotExist, db.ValidationError):
         return abort(404, "Team or contest does not exist")
@@ -234,6 +269,7 @@ def list(cid, tid=None):
 
 @app.api_route('contest/<string:cid>/problem/<string:pid>', methods=['GET'])
 @app.api_route('contest/<string:cid>/problem/<string:pid>/team/<string:tid>', methods=['GET'])
+@paginate('submissions', 100, order=('-submitted_at',), ndjson=True)
 @auth.authenticate
 def list_problem(cid, pid, tid=None):
     """
@@ -257,6 +293,36 @@ def list_problem(cid, pid, tid=None):
         type: string
         required: false
         description: Id of team
+      - name: team_id
+        in: query
+        type: string
+        required: false
+        description: Filter by team (when tid isn't given)
+      - name: status
+        in: query
+        type: string
+        required: false
+        description: Filter by status name (e.g. Accepted)
+      - name: page
+        in: query
+        type: integer
+        required: false
+        description: Page number
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+        description: Submission amount per page (default is 10)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Cursor from next_cursor or prev_cursor of meta (empty for the first page), used instead of page
+      - name: format
+        in: query
+        type: string
+        required: false
+        description: Set ndjson to stream all submissions as newline delimited json
       - name: Access-Token
         in: header
         type: string
@@ -279,7 +345,7 @@ def list_problem(cid, pid, tid=None):
     """
 
     try:
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
         problem_obj = Problem.objects.get(pk=pid)
 
         if not tid:
@@ -294,17 +360,41 @@ def list_problem(cid, pid, tid=None):
 
         submissions = Submission.objects.filter(
             contest=contest_obj,
-            problem=problem_obj,
-            team=team_obj if tid else None
+            problem=problem_obj
         ).order_by('-submitted_at')
 
-        submissions = [s.to_json() for s in submissions]
-        return jsonify(submissions=submissions), 200
+        if tid:
+            submissions = filter_submissions(submissions.filter(team=team_obj))
+        elif request.args.get('team_id'):
+            submissions = filter_submissions(submissions, 'team_id')
+        else:
+            submissions = filter_submissions(submissions.filter(team=None))
+        return submissions, SubmissionSerializer()
 
     except (db.DoesNotExist, db.ValidationError):
         return abort(404, "Team or contest or problem does not exist")
 
 
+def filter_submissions(submissions, *id_args):
+    """
+    Applies status and the given id filters (problem_id, team_id) of the query string.
+    """
+    status = request.args.get('status')
+    if status:
+        try:
+            submissions = submissions.filter(status=JudgementStatusType[status])
+        except KeyError:
+            return abort(400, "Invalid status")
+
+    for arg in id_args:
+        value = request.args.get(arg)
+        if value:
+            if not ObjectId.is_valid(value):
+                return abort(400, "Invalid %s" % arg)
+            submissions = submissions.filter(**{arg[:-3]: value})
+    return submissions
+
+
 @app.api_route('<string:sid>/code', methods=['GET'])
 @auth.authenticate
 def download_code(sid):
@@ -324,9 +414,16 @@ def download_code(sid):
         type: string
         required: true
         description: Token of current user
+      - name: If-None-Match
+        in: header
+        type: string
+        required: false
+        description: ETag of a previously downloaded code file
     responses:
       200:
-        description: Code file
+        description: Code file (ETag is sha1 of the content)
+      304:
+        description: Code file has not been modified
       401:
         description: Token is invalid or has expired
       403:
@@ -337,43 +434,122 @@ def download_code(sid):
     """
 
     try:
-        obj = Submission.objects.get(pk=sid)
-        user_obj = User.objects.get(pk=g.user_id)
+        obj = Submission.objects.no_dereference().get(pk=sid)
 
-        if not obj.team:
-            if (user_obj != obj.contest.owner) and (not user_obj in obj.contest.admins):
+        if not Contest.is_owner_or_admin(obj.contest.id, g.user_id):
+            if not obj.team:
                 return abort(403, "You aren't owner or admin of the contest")
-        else:
-            if (not obj.team.is_user_in_team(user_obj)) and (user_obj != obj.contest.owner) and (
-            not user_obj in obj.contest.admins):
+            if not Team.is_owner_or_member(obj.team.id, g.user_id):
                 return abort(403, "You aren't owner or member of the team")
 
-        return send_file(obj.code_path)
+        code_hash = obj.ensure_code_hash()
+        if request.if_none_match.contains(code_hash):
+            rv = Response(status=304)
+            rv.set_etag(code_hash)
+            return rv
+
+        rv = send_file(obj.open_code(), attachment_filename=obj.filename, add_etags=False)
+        rv.set_etag(code_hash)
+        return rv
+    except IOError:
+        return abort(404, "File does not exist")
     except (db.DoesNotExist, db.ValidationError):
         return abort(404, "Submission does not exist")
 
 
+@app.api_route('contest/<string:cid>/code', methods=['GET'])
+@auth.authenticate
+def download_contest_codes(cid):
+    """
+    Download All The Code Files of a Contest
+    ---
+    tags:
+      - submission
+    parameters:
+      - name: cid
+        in: path
+        type: string
+        required: true
+        description: Id of contest
+      - name: Access-Token
+        in: header
+        type: string
+        required: true
+        description: Token of current user
+    responses:
+      200:
+        description: Zip file of codes (problem_id/team_id/submitted_at/filename, team_id is 'test' for submissions without a team)
+      401:
+        description: Token is invalid or has expired
+      403:
+        description: You aren't owner or admin of the contest
+      404:
+        description: Contest does not exist
+    """
+
+    try:
+        if not Contest.is_owner_or_admin(cid, g.user_id):
+            if Contest.objects(pk=cid).count() == 0:
+                return abort(404, "Contest does not exist")
+            return abort(403, "You aren't owner or admin of the contest")
+
+        submissions = Submission.objects.filter(contest=cid).no_dereference().only(
+            'contest', 'problem', 'team', 'submitted_at', 'filename', 'code_key', 'code_packed'
+        ).order_by('submitted_at')
+
+        files = (((s.code_key or s.make_code_key()).split('/', 1)[1], s.open_code) for s in submissions)
+
+        return Response(
+            stream_with_context(iter_zip(files)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename=%s.zip' % cid}
+        )
+    except (db.DoesNotExist, db.ValidationError):
+        return abort(404, "Contest does not exist")
+
+
 @celery.task()
-def check_code_task(sid, test):
+def check_code_task(sid, test, enqueued_at=None):
+    if enqueued_at is not None:
+        metrics.observe('ijust_judge_queue_wait_seconds', time.time() - enqueued_at)
     obj = Submission.objects.get(pk=sid)
     check_code(obj, test)
 
 
 def check_code(obj, test):
-    status, reason = ijudge.judge(
-        obj.code_path,
-        obj.prog_lang,
-        obj.problem.testcase_dir,
-        obj.problem.time_limit,
-        obj.problem.space_limit
-    )
+    language = obj.prog_lang.name
+    timings = {}
+    judge = partial(ijudge.judge, sandbox=app.config['JUDGE_SANDBOX'], timings=timings)
+    if app.config['JUDGE_FAKE']:
+        judge = partial(ijudge.fake_judge, delay=app.config['JUDGE_FAKE_DELAY'])
+    started = time.time()
+    with obj.code_file() as code_path:
+        try:
+            status, reason = judge(
+                code_path,
+                obj.prog_lang,
+                obj.problem.testcase_dir,
+                obj.problem.time_limit,
+                obj.problem.space_limit
+            )
+        except Exception as e:
+            metrics.inc('ijust_judge_failures_total', language=language, error=type(e).__name__)
+            raise
+    metrics.observe('ijust_judge_seconds', time.time() - started, language=language)
+    if 'compile' in timings:
+        metrics.observe('ijust_judge_compile_seconds', timings['compile'], language=language)
+    metrics.observe('ijust_judge_testcase_seconds', timings.get('testcases', []), language=language)
+    metrics.inc('ijust_judge_verdicts_total', language=language, status=status.name)
+
     obj.status = status
     if reason:
         reason = reason.decode('utf-8', 'ignore')
     obj.reason = reason
     obj.save()
     if not test:
+        started = time.time()
         update_contest_result(obj)
+        metrics.observe('ijust_scoreboard_update_seconds', time.time() - started)
 
 
 def update_contest_result(obj):
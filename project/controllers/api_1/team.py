@@ -2,14 +2,14 @@
 __author__ = 'AminHP'
 
 # flask imports
-from flask import jsonify, request, g, abort
+from flask import request, g, abort
 
 # project imports
 from project import app
 from project.extensions import db, auth
 from project.models.team import Team
-from project.models.user import User
 from project.models.contest import Contest
+from project.modules.fastjson import jsonify
 
 
 @app.api_route('', methods=['POST'])
@@ -67,9 +67,8 @@ def create():
 
     json = request.json
     try:
-        owner = User.objects.get(pk=g.user_id)
-        my_teams = Team.teams(owner)
-        if len(my_teams['owner_teams']) >= 5:
+        owner = g.user
+        if Team.objects(owner=owner).count() >= 5:
             return abort(406, "You can't create more teams")
 
         obj = Team(name=json['name'])
@@ -253,7 +252,7 @@ def list():
         description: Token is invalid or has expired
     """
 
-    user_obj = User.objects.get(pk=g.user_id)
+    user_obj = g.user
     teams = Team.teams(user_obj)
     return jsonify(teams), 200
 
@@ -292,7 +291,7 @@ def delete(tid):
 
     try:
         obj = Team.objects.get(pk=tid)
-        user_obj = User.objects.get(pk=g.user_id)
+        user_obj = g.user
 
         if user_obj != obj.owner:
             return abort(403, "You aren't owner of the team")
@@ -2,12 +2,14 @@
 __author__ = 'AminHP'
 
 # flask imports
-from flask import jsonify, request, g, abort
+from flask import request, g, abort
 
 # project imports
 from project import app
-from project.extensions import db, auth
+from project.extensions import db, auth, throttle
 from project.models.user import User
+from project.modules.hasher import PasswordBusyError
+from project.modules.fastjson import jsonify
 
 
 @app.api_route('signup', methods=['POST'])
@@ -55,6 +57,8 @@ def signup():
         description: Bad request
       409:
         description: Email or username already exists
+      503:
+        description: Server is busy
     """
 
     json = request.json
@@ -66,6 +70,8 @@ def signup():
         return jsonify(obj.to_json()), 201
     except db.NotUniqueError:
         return abort(409, "Email or username already exists")
+    except PasswordBusyError:
+        return abort(503, "Server is busy, try again later")
 
 
 @app.api_route('login', methods=['POST'])
@@ -109,19 +115,29 @@ def login():
         description: User does not exist
       406:
         description: Wrong password
+      429:
+        description: Too many login attempts
+      503:
+        description: Server is busy
     """
 
     json = request.json
     login = json['login']
     password = json['password']
 
+    retry_after = throttle.hit('login_ip', request.remote_addr) or \
+                  throttle.hit('login_account', login.lower())
+    if retry_after:
+        g.retry_after = retry_after
+        return abort(429, "Too many login attempts, try again in %d seconds" % retry_after)
+
     try:
         if '@' in login:
             obj = User.objects.get(email=login)
         else:
             obj = User.objects.get(username=login)
 
-        if obj.verify_password(password):
+        if obj.verify_and_update_password(password):
             token = auth.generate_token(obj.pk)
             return jsonify(token=token), 200
         else:
@@ -129,6 +145,8 @@ def login():
 
     except (db.DoesNotExist, db.ValidationError):
         return abort(404, "User does not exist")
+    except PasswordBusyError:
+        return abort(503, "Server is busy, try again later")
 
 
 @app.api_route('login_with_token', methods=['POST'])
@@ -259,7 +277,10 @@ def myinfo():
         description: User does not exist
     """
 
-    return info(uid=g.user_id)
+    try:
+        return jsonify(g.user.to_json()), 200
+    except (db.DoesNotExist, db.ValidationError):
+        return abort(404, "User does not exist")
 
 
 @app.api_route('', methods=['PUT'])
@@ -320,6 +341,8 @@ def edit():
         description: User does not exist
       406:
         description: Wrong password
+      503:
+        description: Server is busy
     """
 
     json = request.json
@@ -335,3 +358,5 @@ def edit():
         return jsonify(obj.to_json()), 200
     except (db.DoesNotExist, db.ValidationError):
         return abort(404, "User does not exist")
+    except PasswordBusyError:
+        return abort(503, "Server is busy, try again later")
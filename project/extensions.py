@@ -7,7 +7,6 @@ from flask_celery import Celery
 from flask_redis import FlaskRedis
 from flask_mongoengine import MongoEngine
 from flask_cors import CORS
-from flask_admin import Admin
 
 # project extentions
 from project.modules.schema_validator import Validator
@@ -15,6 +14,14 @@ from project.modules.api_router import ApiRouter
 from project.modules.api_doc import ApiDoc
 from project.modules.auth import Auth
 from project.modules.recaptcha import ReCaptcha
+from project.modules.code_pack import CodePack
+from project.modules.upload import Upload
+from project.modules.hasher import PasswordHasher
+from project.modules.throttle import Throttle
+from project.modules.tiered_cache import TieredCache
+from project.modules.instrumentation import Instrumentation
+from project.modules.metrics import Metrics
+from project.modules.admin.lazy_admin import LazyAdmin
 
 
 cache = Cache()
@@ -27,4 +34,11 @@ api_router = ApiRouter()
 api_doc = ApiDoc()
 auth = Auth(redis)
 recaptcha = ReCaptcha()
-admin = Admin(template_mode='bootstrap3', url='/admin')
+code_pack = CodePack()
+upload = Upload()
+hasher = PasswordHasher(redis)
+throttle = Throttle(redis)
+tiered_cache = TieredCache(redis)
+instrumentation = Instrumentation(redis)
+metrics = Metrics(redis)
+admin = LazyAdmin(template_mode='bootstrap3', url='/admin')
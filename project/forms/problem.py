@@ -1,26 +1,21 @@
 # -*- coding: utf-8 -*-
 __author__ = 'AminHP'
 
-# python imports
-import magic
-
 # flask imports
 from wtforms import FileField
 from wtforms.validators import DataRequired
 from flask.ext.wtf import FlaskForm
 
+# project imports
+from project.modules.sniffer import sniff_file
+
 
 class UploadProblemBody(FlaskForm):
     body = FileField(validators=[DataRequired()])
     allowed_extensions = ['application/pdf']
 
     def validate_file(self):
-        data = self.body.data.read(16)
-        self.body.data.seek(0)
-
-        if not magic.from_buffer(data, mime=True) in self.allowed_extensions:
-            return False
-        return True
+        return sniff_file(self.body.data, fallback=False) in self.allowed_extensions
 
 
 class UploadTestCase(FlaskForm):
@@ -28,9 +23,4 @@ class UploadTestCase(FlaskForm):
     allowed_extensions = ['application/zip']
 
     def validate_file(self):
-        data = self.testcase.data.read(16)
-        self.testcase.data.seek(0)
-
-        if not magic.from_buffer(data, mime=True) in self.allowed_extensions:
-            return False
-        return True
+        return sniff_file(self.testcase.data, fallback=False) in self.allowed_extensions
@@ -1,9 +1,6 @@
 # -*- coding: utf-8 -*-
 __author__ = 'AminHP'
 
-# python imports
-import magic
-
 # flask imports
 from wtforms import FileField, StringField, IntegerField
 from wtforms.validators import DataRequired, InputRequired, NumberRange
@@ -11,6 +8,7 @@ from flask.ext.wtf import FlaskForm
 
 # project imports
 from project.models.submission import ProgrammingLanguageType
+from project.modules.sniffer import sniff_file
 
 
 class UploadCode(FlaskForm):
@@ -23,13 +21,7 @@ class UploadCode(FlaskForm):
 
 
     def validate_file(self):
-        data = self.code.data.read(16)
-        self.code.data.seek(0)
-
-        #if not magic.from_buffer(data, mime=True) in self.allowed_extensions:
-        #    return False
-        #return True
-        return magic.from_buffer(data, mime=True).startswith('text/')
+        return sniff_file(self.code.data).startswith('text/')
 
 
     def to_json(self):
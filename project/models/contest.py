@@ -6,12 +6,18 @@ __author__ = ['AminHP', 'SALAR']
 # python imports
 import os
 import shutil
+from bson import ObjectId
 
 # project imports
 from project import app
-from project.extensions import db, admin
-from project.modules.datetime import utcnowts
-from project.models.team import Team
+from project.extensions import db, admin, code_pack, tiered_cache, redis
+from project.modules import cached
+from project.modules.datetime import utcnowts, request_nowts, boundary_timeout
+from project.modules.fastjson import dumps
+from project.modules.serializer import Serializer, Ref
+from project.models.user import UserAbsSerializer
+from project.models.team import Team, TeamSerializer, TeamAbsSerializer
+from project.models.membership import Membership
 
 
 class Problem(db.Document):
@@ -31,12 +37,32 @@ class Problem(db.Document):
     def testcase_dir(self):
         return os.path.join(app.config['TESTCASE_DIR'], str(self.pk))
 
+    def save(self, *args, **kwargs):
+        super(Problem, self).save(*args, **kwargs)
+        Problem.invalidate_cache(self.pk)
+
     def delete(self, *args, **kwargs):
         if os.path.exists(self.body_path):
             os.remove(self.body_path)
         if os.path.exists(self.testcase_dir):
             shutil.rmtree(self.testcase_dir)
+        # the problem is pulled from its contests by the delete
+        contests = list(Contest._get_collection().find({'problems': self.pk}, {'_id': 1}))
         super(Problem, self).delete(*args, **kwargs)
+        Problem.invalidate_cache(self.pk, contests)
+
+    @classmethod
+    def invalidate_cache(cls, pid, contests=None):
+        if contests is None:
+            contests = Contest._get_collection().find({'problems': pid}, {'_id': 1})
+        cached.delete('problem:%s' % pid, *['contest:%s:problems' % c['_id'] for c in contests])
+
+    @classmethod
+    def cached_json(cls, pid):
+        def build():
+            obj = cls.objects(pk=pid).first()
+            return obj.to_json() if obj else None
+        return cached.get('problem', 'problem:%s' % pid, build, app.config['CONTEST_CACHE_TIMEOUT'])
 
     def populate(self, json):
         if 'title' in json:
@@ -88,6 +114,20 @@ class Result(db.Document):
         'collection': 'results'
     }
 
+    @staticmethod
+    def changes_key(rid):
+        return 'result:%s:changes' % rid
+
+    @staticmethod
+    def changes(rid):
+        """
+        Count of updates of the result, for cache keys (a redis read).
+        """
+        return int(redis.get(Result.changes_key(rid)) or 0)
+
+    def changed(self):
+        redis.incr(Result.changes_key(self.pk))
+
     @staticmethod
     def _make_query_ids(tid, pid):
         tqid = "teams__%s" % tid
@@ -147,6 +187,7 @@ class Result(db.Document):
             "last_time_result_changed": last_time_result_changed
         }
         Result.objects(**find_query).update(set__sorted_team_ids=sorted_team_ids)
+        self.changed()
 
     def update_failed_try(self, tid, pid, submitted_at, penalty=20):
         self._check_existence(tid, pid)
@@ -161,7 +202,8 @@ class Result(db.Document):
             ("inc__%s__failed_tries" % pqid): 1,
             ("inc__%s__penalty" % pqid): penalty
         }
-        Result.objects(**find_query).update(**update_query)
+        if Result.objects(**find_query).update(**update_query):
+            self.changed()
 
     def update_succeed_try(self, tid, pid, submitted_at, contest_starts_at):
         self._check_existence(tid, pid)
@@ -219,9 +261,9 @@ class Contest(db.Document):
     meta = {
         'collection': 'contests',
         'indexes': [
-            '-starts_at',
-            'owner',
-            'admins',
+            ('-starts_at', '-_id'),
+            ('owner', '-starts_at', '-_id'),
+            ('admins', '-starts_at', '-_id'),
             'pending_teams',
             'accepted_teams',
             'problems'
@@ -241,26 +283,85 @@ class Contest(db.Document):
     def pre_delete(cls, sender, document, **kwargs):
         if document.result:
             document.result.delete()
+        code_pack.remove(document.pk)
+        Membership.remove(contest=document.pk)
+
+    @classmethod
+    def post_delete(cls, sender, document, **kwargs):
+        Contest.invalidate_cache(document.pk)
 
     def save(self):
         if not (self.created_at < self.starts_at < self.ends_at):
             raise ContestDateTimeError()
+        changed = set(f.split('.')[0] for f in self._get_changed_fields())
         super(Contest, self).save()
+        if changed & {'pending_teams', 'accepted_teams'}:
+            Membership.sync_contest(self.pk)
+        Contest.invalidate_cache(self.pk)
+
+    def update(self, **kwargs):
+        result = super(Contest, self).update(**kwargs)
+        Contest.invalidate_cache(self.pk)
+        return result
+
+    @classmethod
+    def invalidate_cache(cls, cid):
+        cached.delete('contest:%s:core' % cid, 'contest:%s:problems' % cid)
+
+    @classmethod
+    def cached_cores(cls, ids):
+        """
+        Returns {id: core} of existing contests, see ContestCoreSerializer.
+        Cores expire at the start and the end of their contests too.
+        """
+        now = request_nowts()
+        return cached.get_many(
+            'contest', 'contest:%s:core', ids,
+            ContestCoreSerializer().load,
+            lambda core: boundary_timeout(
+                app.config['CONTEST_CACHE_TIMEOUT'], now,
+                core['json']['starts_at'], core['json']['ends_at'] + 1
+            )
+        )
+
+    @classmethod
+    def cached_core(cls, cid):
+        if not ObjectId.is_valid(cid):
+            return None
+        cid = ObjectId(cid)
+        return cls.cached_cores([cid]).get(cid)
+
+    @classmethod
+    def cached_problems(cls, cid):
+        def build():
+            obj = cls.objects(pk=cid).first()
+            return obj.to_json_problems() if obj else None
+        return cached.get('contest_problems', 'contest:%s:problems' % cid, build, app.config['CONTEST_CACHE_TIMEOUT'])
+
+    @staticmethod
+    def core_allows(core, user_obj):
+        """
+        Owner, admins, accepted members after the start and everyone after the end.
+        """
+        json = core['json']
+        uid = str(user_obj.pk)
+        now = request_nowts()
+        return (json['owner'] and json['owner']['id'] == uid) or \
+               uid in core['admins'] or \
+               (now >= json['starts_at'] and Membership.is_accepted(ObjectId(json['id']), user_obj.pk)) or \
+               (now > json['ends_at'])
+
+    @classmethod
+    def is_owner_or_admin(cls, cid, uid):
+        return cls.objects(db.Q(owner=uid) | db.Q(admins=uid), pk=cid).count() > 0
 
     def is_user_in_contest(self, user_obj):
-        for team in self.accepted_teams:
-            if team.is_user_in_team(user_obj):
-                return True
-        return False
+        return Membership.is_accepted(self.pk, user_obj.pk)
 
     def user_joining_status(self, user_obj):
-        for team in self.accepted_teams:
-            if team.is_user_in_team(user_obj):
-                return 2, team
-        for team in self.pending_teams:
-            if team.is_user_in_team(user_obj):
-                return 1, team
-        return 0, None
+        status, tid = Membership.joining_status(self.pk, user_obj.pk)
+        team = Team.objects(pk=tid).first() if tid else None
+        return (status, team) if team else (0, None)
 
     def populate(self, json):
         if 'name' in json:
@@ -270,19 +371,26 @@ class Contest(db.Document):
         if 'ends_at' in json:
             self.ends_at = json['ends_at']
 
-    def to_json(self):
+    @staticmethod
+    def time_flags(starts_at, ends_at, now):
         return dict(
+            is_active=starts_at <= now <= ends_at,
+            is_ended=ends_at < now
+        )
+
+    def to_json(self):
+        json = dict(
             id=str(self.pk),
             name=self.name,
             owner=self.owner.to_json_abs(),
             created_at=self.created_at,
             starts_at=self.starts_at,
             ends_at=self.ends_at,
-            is_active=True if self.starts_at <= utcnowts() <= self.ends_at else False,
-            is_ended=True if self.ends_at < utcnowts() else False,
             pending_teams_num=len(self.pending_teams),
             accepted_teams_num=len(self.accepted_teams)
         )
+        json.update(Contest.time_flags(self.starts_at, self.ends_at, request_nowts()))
+        return json
 
     def to_json_user(self, user_obj):
         json = self.to_json()
@@ -301,18 +409,21 @@ class Contest(db.Document):
         )
 
     def to_json_teams(self, category):
+        # to_mongo gives team ids without dereferencing the teams
+        son = self.to_mongo()
+        serializer = TeamSerializer()
         if category == 'pending':
             return dict(
-                pending_teams=[team.to_json() for team in self.pending_teams]
+                pending_teams=serializer.dump_ids(son.get('pending_teams', []))
             )
         elif category == 'accepted':
             return dict(
-                accepted_teams=[team.to_json() for team in self.accepted_teams]
+                accepted_teams=serializer.dump_ids(son.get('accepted_teams', []))
             )
         else:
             return dict(
-                pending_teams=[team.to_json() for team in self.pending_teams],
-                accepted_teams=[team.to_json() for team in self.accepted_teams]
+                pending_teams=serializer.dump_ids(son.get('pending_teams', [])),
+                accepted_teams=serializer.dump_ids(son.get('accepted_teams', []))
             )
 
     def to_json_problems(self):
@@ -320,13 +431,38 @@ class Contest(db.Document):
             problems=[prob.to_json_abs() for prob in self.problems]
         )
 
+    def result_cache_key(self):
+        """
+        Changes with the result, accepted teams and problems of the contest.
+        """
+        # raw references of _data, neither dereferenced nor converted
+        result = self._data.get('result')
+        rid = getattr(result, 'pk', getattr(result, 'id', result))
+        return 'contest:%s:result:%d:%d:%d' % (
+            self.pk, Result.changes(rid),
+            len(self._data.get('accepted_teams') or []),
+            len(self._data.get('problems') or [])
+        )
+
+    @tiered_cache.cached(
+        key=lambda self: self.result_cache_key(),
+        timeout=lambda: app.config['RESULT_CACHE_TIMEOUT']
+    )
+    def encoded_result(self):
+        """
+        to_json_result encoded, shared by all processes and rebuilt by one of them.
+        """
+        return dumps(self.to_json_result())
+
     def to_json_result(self):
-        sorted_teams = [Team.objects.get(pk=tid) for tid in self.result.sorted_team_ids]
-        accepted_teams = set(self.accepted_teams)
+        accepted_teams = self.to_mongo().get('accepted_teams', [])
+        names = Team._get_collection().find({'_id': {'$in': accepted_teams}}, {'name': 1})
+        names = dict((str(t['_id']), t['name']) for t in names)
 
-        all_teams = [t for t in sorted_teams if t in accepted_teams]
-        all_teams += accepted_teams.difference(sorted_teams)
-        all_teams = [dict(id=str(t.pk), name=t.name) for t in all_teams]
+        sorted_team_ids = self.result.sorted_team_ids
+        team_ids = [tid for tid in sorted_team_ids if tid in names]
+        team_ids += set(names).difference(sorted_team_ids)
+        all_teams = [dict(id=tid, name=names[tid]) for tid in team_ids]
 
         return dict(
             result=self.result.teams,
@@ -338,10 +474,100 @@ class Contest(db.Document):
         return self.name
 
 
+class ProblemAbsSerializer(Serializer):
+    model = Problem
+    fields = ('title',)
+
+    def dump(self, doc):
+        return dict(
+            id=str(doc['_id']),
+            title=doc.get('title')
+        )
+
+
+class ContestSerializer(Serializer):
+    model = Contest
+    fields = ('name', 'created_at', 'starts_at', 'ends_at', 'pending_teams', 'accepted_teams')
+    refs = {
+        'owner': Ref(UserAbsSerializer())
+    }
+
+    def dump_core(self, doc):
+        """
+        Everything except the time flags, which change without the document.
+        """
+        return dict(
+            id=str(doc['_id']),
+            name=doc['name'],
+            owner=doc.get('owner'),
+            created_at=doc['created_at'],
+            starts_at=doc['starts_at'],
+            ends_at=doc['ends_at'],
+            pending_teams_num=len(doc.get('pending_teams', [])),
+            accepted_teams_num=len(doc.get('accepted_teams', []))
+        )
+
+    def dump(self, doc):
+        json = self.dump_core(doc)
+        json.update(Contest.time_flags(doc['starts_at'], doc['ends_at'], request_nowts()))
+        return json
+
+
+class ContestCoreSerializer(ContestSerializer):
+    """
+    The user independent part of to_json_user with the admin ids, cached per contest.
+    """
+    fields = ContestSerializer.fields + ('admins',)
+
+    def dump(self, doc):
+        return dict(
+            json=self.dump_core(doc),
+            admins=[str(uid) for uid in doc.get('admins', [])]
+        )
+
+
+class ContestUserSerializer(Serializer):
+    """
+    Contest.to_json_user of many contests from the cached cores, joining
+    statuses are loaded with one query.
+    """
+    model = Contest
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    def dump_many(self, docs):
+        ids = [doc['_id'] for doc in docs]
+        cores = Contest.cached_cores(ids)
+        statuses = Membership.joining_statuses(ids, self.user_id)
+        teams = TeamAbsSerializer().load(tid for status, tid in statuses.values())
+
+        now = request_nowts()
+        uid = str(self.user_id)
+        result = []
+        for cid in ids:
+            core = cores.get(cid)
+            if core is None:
+                continue
+            json = dict(core['json'])
+            json.update(Contest.time_flags(json['starts_at'], json['ends_at'], now))
+            status, tid = statuses.get(cid, (0, None))
+            team = teams.get(tid)
+            json['joining_status'] = dict(
+                status=status if team else 0,
+                team=team
+            )
+            json['is_owner'] = bool(json['owner']) and json['owner']['id'] == uid
+            json['is_admin'] = uid in core['admins']
+            result.append(json)
+        return result
+
+
 db.post_save.connect(Contest.post_save, sender=Contest)
 db.pre_delete.connect(Contest.pre_delete, sender=Contest)
-admin.add_view(ContestView(Contest, category='Contest'))
-admin.add_view(ProblemView(Problem, category='Contest'))
+db.post_delete.connect(Contest.post_delete, sender=Contest)
+admin.add_lazy_view(ContestView, Contest, category='Contest')
+admin.add_lazy_view(ProblemView, Problem, category='Contest')
 
 
 class ContestDateTimeError(db.ValidationError):
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# project imports
+from project.extensions import db
+
+
+class Membership(db.Document):
+    """
+    Denormalized (user, team, contest, status) rows, so the joining status of
+    a user is one indexed lookup instead of dereferencing every team of a contest.
+    Rows are rebuilt from contests and teams by the sync methods whenever the
+    teams of a contest or the members of a team change.
+    """
+
+    PENDING = 1
+    ACCEPTED = 2
+
+    user = db.ReferenceField('User', required=True)
+    team = db.ReferenceField('Team', required=True)
+    contest = db.ReferenceField('Contest', required=True)
+    status = db.IntField(required=True, choices=(PENDING, ACCEPTED))
+
+    meta = {
+        'collection': 'memberships',
+        'indexes': [
+            ('user', 'contest', '-status'),
+            'team',
+            'contest'
+        ]
+    }
+
+    @classmethod
+    def sync(cls, team_id, contest_id=None):
+        """
+        Rebuilds rows of a team in one contest, or in all contests.
+        """
+        from project.models.contest import Contest
+
+        query = {'team': team_id}
+        contests_query = {'$or': [{'pending_teams': team_id}, {'accepted_teams': team_id}]}
+        if contest_id is not None:
+            query['contest'] = contest_id
+            contests_query['_id'] = contest_id
+
+        contests = Contest._get_collection().find(contests_query, {'pending_teams': 1, 'accepted_teams': 1})
+        cls._rebuild(query, contests)
+
+    @classmethod
+    def sync_contest(cls, contest_id):
+        """
+        Rebuilds rows of all teams of a contest.
+        """
+        from project.models.contest import Contest
+
+        contests = Contest._get_collection().find({'_id': contest_id}, {'pending_teams': 1, 'accepted_teams': 1})
+        cls._rebuild({'contest': contest_id}, contests)
+
+    @classmethod
+    def rebuild(cls):
+        from project.models.contest import Contest
+
+        contests = Contest._get_collection().find({}, {'pending_teams': 1, 'accepted_teams': 1})
+        return cls._rebuild({}, contests)
+
+    @classmethod
+    def _rebuild(cls, query, contests):
+        from project.models.team import Team
+
+        rows = []
+        for contest in contests:
+            accepted = set(contest.get('accepted_teams', []))
+            for tid in contest.get('pending_teams', []) + contest.get('accepted_teams', []):
+                if 'team' in query and tid != query['team']:
+                    continue
+                status = cls.ACCEPTED if tid in accepted else cls.PENDING
+                rows.append(dict(team=tid, contest=contest['_id'], status=status))
+
+        team_ids = list(set(row['team'] for row in rows))
+        users = {}
+        for team in Team._get_collection().find({'_id': {'$in': team_ids}}, {'owner': 1, 'members': 1}):
+            users[team['_id']] = [team['owner']] + team.get('members', [])
+
+        docs = []
+        for row in rows:
+            docs += [dict(row, user=uid) for uid in users.get(row['team'], [])]
+
+        collection = cls._get_collection()
+        collection.delete_many(query)
+        if docs:
+            collection.insert_many(docs, ordered=False)
+        return len(docs)
+
+    @classmethod
+    def remove(cls, **kwargs):
+        cls.objects(**kwargs).delete()
+
+    @classmethod
+    def joining_status(cls, contest_id, user_id):
+        """
+        Returns (status, team id), accepted teams come first.
+        """
+        doc = cls._get_collection().find_one(
+            {'user': user_id, 'contest': contest_id},
+            {'team': 1, 'status': 1},
+            sort=[('status', -1)]
+        )
+        if doc is None:
+            return 0, None
+        return doc['status'], doc['team']
+
+    @classmethod
+    def joining_statuses(cls, contest_ids, user_id):
+        """
+        Returns {contest id: (status, team id)} of the contests the user has joined.
+        """
+        result = {}
+        docs = cls._get_collection().find(
+            {'user': user_id, 'contest': {'$in': list(contest_ids)}},
+            {'contest': 1, 'team': 1, 'status': 1}
+        )
+        for doc in docs:
+            if doc['status'] > result.get(doc['contest'], (0, None))[0]:
+                result[doc['contest']] = (doc['status'], doc['team'])
+        return result
+
+    @classmethod
+    def is_accepted(cls, contest_id, user_id):
+        return cls.objects(user=user_id, contest=contest_id, status=cls.ACCEPTED).count() > 0
@@ -5,14 +5,37 @@ __author__ = ['AminHP', 'SALAR']
 
 # python imports
 import os
+import errno
 import shutil
+import hashlib
+import tempfile
+from uuid import uuid4
+from contextlib import contextmanager
 
 # project imports
 from project import app
-from project.extensions import db, admin
+from project.extensions import db, admin, code_pack, redis
 from project.modules.datetime import utcnowts
 from project.modules.fields import IntEnumField
+from project.modules.serializer import Serializer, Ref
 from project.modules.ijudge.types import JudgementStatusType, ProgrammingLanguageType
+from project.models.user import UserAbsSerializer
+from project.models.contest import ProblemAbsSerializer
+
+
+def remove_empty_parents(path, root):
+    """
+    Removes the empty directories from path up to root (root is kept).
+    """
+    root = os.path.abspath(root)
+    path = os.path.abspath(path)
+    while path.startswith(root + os.sep):
+        try:
+            os.rmdir(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                return
+        path = os.path.dirname(path)
 
 
 class Submission(db.Document):
@@ -28,38 +51,139 @@ class Submission(db.Document):
     status = IntEnumField(enum=JudgementStatusType, required=True, default=JudgementStatusType.Pending)
     reason = db.StringField()
 
+    code_key = db.StringField()
+    code_hash = db.StringField()
+    code_packed = db.BooleanField(default=False)
+
     meta = {
         'collection': 'submissions',
         'indexes': [
             '-submitted_at',
-            'contest',
-            ('contest', 'team'),
-            ('contest', 'problem'),
-            ('contest', 'problem', 'team')
+            ('contest', '-submitted_at', '-_id'),
+            ('contest', 'team', '-submitted_at', '-_id'),
+            ('contest', 'team', 'status'),
+            ('contest', 'status', '-submitted_at', '-_id'),
+            ('contest', 'problem', '-submitted_at', '-_id'),
+            ('contest', 'problem', 'team', '-submitted_at', '-_id')
         ]
     }
 
+    pack_lock_timeout = 3600 # seconds, a crashed packing frees its contest after this
+
     @property
     def data_dir(self):
-        return os.path.join(
-            app.config['SUBMISSION_DIR'],
-            str(self.contest.pk),
-            str(self.problem.pk),
-            str(self.team.pk) if self.team else 'test',
-            str(self.submitted_at)
-        )
+        return os.path.dirname(self.code_path)
 
     @property
     def code_path(self):
         return os.path.join(
-            self.data_dir,
-            self.filename
+            app.config['SUBMISSION_DIR'],
+            self.code_key or self.make_code_key()
         )
 
+    def make_code_key(self):
+        # works on dereferenced documents and on raw DBRefs (no_dereference)
+        return '/'.join([
+            str(self.contest.id),
+            str(self.problem.id),
+            str(self.team.id) if self.team else 'test',
+            str(self.submitted_at),
+            self.filename
+        ])
+
+    def save_code(self, file_obj):
+        self.code_key = self.make_code_key()
+        directory = self.data_dir
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        sha = hashlib.sha1()
+        with open(self.code_path, 'wb') as f:
+            for data in iter(lambda: file_obj.read(64 * 1024), ''):
+                sha.update(data)
+                f.write(data)
+        self.code_hash = sha.hexdigest()
+
+    def open_code(self):
+        if self.code_packed:
+            return code_pack.open(self.contest.id, self.pk)
+        return open(self.code_path, 'rb')
+
+    @contextmanager
+    def code_file(self):
+        """
+        Yields a path of the code file, packed codes are extracted to a temp directory.
+        """
+        if not self.code_packed:
+            yield self.code_path
+            return
+
+        directory = tempfile.mkdtemp(dir=app.config['TEMP_DIR'])
+        try:
+            path = os.path.join(directory, self.filename)
+            with open(path, 'wb') as f:
+                f.write(code_pack.read(self.contest.id, self.pk))
+            yield path
+        finally:
+            shutil.rmtree(directory)
+
+    @classmethod
+    def pack_contest(cls, cid):
+        """
+        Moves judged codes of the contest into its pack and removes their
+        directories. Returns None if another process is packing the contest.
+        """
+        lock_key = 'submission:pack:%s' % cid
+        token = uuid4().hex
+        if not redis.set(lock_key, token, nx=True, ex=cls.pack_lock_timeout):
+            return None
+        try:
+            return cls._pack_contest(cid)
+        finally:
+            if redis.get(lock_key) == token:
+                redis.delete(lock_key)
+
+    @classmethod
+    def _pack_contest(cls, cid):
+        submissions = cls.objects(
+            contest=cid,
+            code_packed__ne=True,
+            status__ne=JudgementStatusType.Pending
+        ).no_dereference().only(
+            'contest', 'problem', 'team', 'submitted_at', 'filename', 'code_key'
+        ).order_by('pk')
+        submissions = [s for s in submissions if os.path.isfile(s.code_path)]
+        if not submissions:
+            return 0
+
+        def blobs():
+            for s in submissions:
+                with open(s.code_path, 'rb') as f:
+                    yield s.pk, f
+
+        code_pack.add(cid, blobs())
+        cls.objects(pk__in=[s.pk for s in submissions]).update(set__code_packed=True)
+        for s in submissions:
+            shutil.rmtree(s.data_dir, ignore_errors=True)
+            remove_empty_parents(s.data_dir, app.config['SUBMISSION_DIR'])
+        return len(submissions)
+
+    def ensure_code_hash(self):
+        if self.code_hash:
+            return self.code_hash
+        sha = hashlib.sha1()
+        with self.open_code() as f:
+            for data in iter(lambda: f.read(64 * 1024), ''):
+                sha.update(data)
+        self.code_hash = sha.hexdigest()
+        Submission.objects(pk=self.pk).update_one(set__code_hash=self.code_hash)
+        return self.code_hash
+
     @classmethod
     def pre_delete(cls, sender, document, **kwargs):
         if os.path.exists(document.data_dir):
             shutil.rmtree(document.data_dir)
+            remove_empty_parents(document.data_dir, app.config['SUBMISSION_DIR'])
 
     def populate(self, json):
         self.filename = json['filename']
@@ -86,5 +210,26 @@ class Submission(db.Document):
         )
 
 
+class SubmissionSerializer(Serializer):
+    model = Submission
+    fields = ('filename', 'prog_lang', 'submitted_at', 'status', 'reason')
+    refs = {
+        'problem': Ref(ProblemAbsSerializer()),
+        'user': Ref(UserAbsSerializer())
+    }
+
+    def dump(self, doc):
+        return dict(
+            id=str(doc['_id']),
+            filename=doc['filename'],
+            prog_lang=ProgrammingLanguageType(doc['prog_lang']).name,
+            submitted_at=doc['submitted_at'],
+            problem=doc.get('problem'),
+            user=doc.get('user'),
+            status=JudgementStatusType(doc['status']).name,
+            reason=doc.get('reason')
+        )
+
+
 db.pre_delete.connect(Submission.pre_delete, sender=Submission)
-admin.add_view(SubmissionView(Submission))
+admin.add_lazy_view(SubmissionView, Submission)
@@ -5,7 +5,9 @@ __author__ = ['AminHP', 'SALAR']
 
 # project imports
 from project.extensions import db, admin
-from project.models.user import User
+from project.modules.serializer import Serializer, Ref
+from project.models.user import User, UserSerializer, UserAbsSerializer
+from project.models.membership import Membership
 
 
 class Team(db.Document):
@@ -22,14 +24,31 @@ class Team(db.Document):
         ]
     }
 
+    @classmethod
+    def post_save(cls, sender, document, **kwargs):
+        if not kwargs.get('created'):
+            Membership.sync(document.pk)
+
+    @classmethod
+    def post_delete(cls, sender, document, **kwargs):
+        # team counts of the cached contests change when the team is pulled
+        from project.models.contest import Contest
+        contest_ids = Membership._get_collection().distinct('contest', {'team': document.pk})
+        Membership.remove(team=document.pk)
+        for contest_id in contest_ids:
+            Contest.invalidate_cache(contest_id)
+
     @classmethod
     def teams(cls, user_obj):
-        owner_teams = cls.objects.filter(owner=user_obj)
-        owner_teams = [t.to_json() for t in owner_teams]
-        member_teams = cls.objects.filter(members=user_obj)
-        member_teams = [t.to_json() for t in member_teams]
+        serializer = TeamSerializer()
+        owner_teams = serializer.dump_query(cls.objects.filter(owner=user_obj))
+        member_teams = serializer.dump_query(cls.objects.filter(members=user_obj))
         return dict(owner_teams=owner_teams, member_teams=member_teams)
 
+    @classmethod
+    def is_owner_or_member(cls, tid, uid):
+        return cls.objects(db.Q(owner=uid) | db.Q(members=uid), pk=tid).count() > 0
+
     def is_user_in_team(self, user_obj):
         return user_obj == self.owner or user_obj in self.members
 
@@ -38,7 +57,11 @@ class Team(db.Document):
             self.name = json['name']
         if 'members' in json:
             members = filter(lambda un: un != self.owner.username, json['members'])
-            self.members = [User.objects.get(username=username) for username in members]
+            users = User.objects(username__in=members).only('username')
+            users = dict((user.username, user) for user in users)
+            if len(users) < len(set(members)):
+                raise User.DoesNotExist()
+            self.members = [users[username] for username in members]
 
     def to_json(self):
         return dict(
@@ -62,4 +85,38 @@ class Team(db.Document):
         )
 
 
-admin.add_view(TeamView(Team))
+class TeamSerializer(Serializer):
+    model = Team
+    fields = ('name',)
+    refs = {
+        'owner': Ref(UserAbsSerializer()),
+        'members': Ref(UserAbsSerializer(), many=True)
+    }
+
+    def dump(self, doc):
+        return dict(
+            id=str(doc['_id']),
+            name=doc.get('name'),
+            owner=doc.get('owner'),
+            members=doc.get('members', [])
+        )
+
+
+class TeamAbsSerializer(Serializer):
+    model = Team
+    fields = ('name',)
+    refs = {
+        'owner': Ref(UserSerializer())
+    }
+
+    def dump(self, doc):
+        return dict(
+            id=str(doc['_id']),
+            name=doc.get('name'),
+            owner=doc.get('owner')
+        )
+
+
+db.post_save.connect(Team.post_save, sender=Team)
+db.post_delete.connect(Team.post_delete, sender=Team)
+admin.add_lazy_view(TeamView, Team)
@@ -1,11 +1,9 @@
 # -*- coding: utf-8 -*-
 __author__ = ['AminHP', 'SALAR']
 
-# python imports
-from passlib.apps import custom_app_context as pwd_context
-
 # project imports
-from project.extensions import db, admin
+from project.extensions import db, admin, auth, hasher
+from project.modules.serializer import Serializer
 from project.modules.admin.user_view import UserView
 
 
@@ -24,13 +22,34 @@ class User(db.Document):
         ]
     }
 
+    @classmethod
+    def post_save(cls, sender, document, **kwargs):
+        auth.forget_user(document.pk)
+        if not kwargs.get('created'):
+            # the username is a part of the cached contests of the owner
+            from project.models.contest import Contest
+            for contest_obj in Contest.objects(owner=document.pk).only('id'):
+                Contest.invalidate_cache(contest_obj.pk)
+
+    @classmethod
+    def post_delete(cls, sender, document, **kwargs):
+        auth.forget_user(document.pk)
+
     def hash_password(self, password):
         password = password.encode('utf-8')
-        self.password = pwd_context.encrypt(password)
+        self.password = hasher.hash(password)
 
     def verify_password(self, password):
         password = password.encode('utf-8')
-        return pwd_context.verify(password, self.password)
+        return hasher.verify(password, self.password)
+
+    def verify_and_update_password(self, password):
+        password = password.encode('utf-8')
+        valid, new_hash = hasher.verify_and_update(password, self.password)
+        if valid and new_hash:
+            self.password = new_hash
+            User.objects(pk=self.pk).update_one(set__password=new_hash)
+        return valid
 
     def change_password(self, old_password, new_password):
         if self.verify_password(old_password):
@@ -67,4 +86,31 @@ class User(db.Document):
         return self.username
 
 
-admin.add_view(UserView(User))
+class UserSerializer(Serializer):
+    model = User
+    fields = ('username', 'email', 'firstname', 'lastname')
+
+    def dump(self, doc):
+        return dict(
+            id=str(doc['_id']),
+            username=doc.get('username'),
+            email=doc.get('email'),
+            firstname=doc.get('firstname'),
+            lastname=doc.get('lastname')
+        )
+
+
+class UserAbsSerializer(Serializer):
+    model = User
+    fields = ('username',)
+
+    def dump(self, doc):
+        return dict(
+            id=str(doc['_id']),
+            username=doc.get('username')
+        )
+
+
+db.post_save.connect(User.post_save, sender=User)
+db.post_delete.connect(User.post_delete, sender=User)
+admin.add_lazy_view(UserView, User)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# flask imports
+from flask_admin import Admin
+
+
+class LazyAdmin(Admin):
+    """
+    Admin whose model views are made only if ADMIN_ENABLED, so api only
+    workers don't build and register them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(LazyAdmin, self).__init__(*args, **kwargs)
+        self.enabled = None
+        self.lazy_views = []
+
+
+    def init_app(self, app):
+        self.enabled = app.config['ADMIN_ENABLED']
+        if not self.enabled:
+            return
+        super(LazyAdmin, self).init_app(app)
+        for view_class, args, kwargs in self.lazy_views:
+            self.add_view(view_class(*args, **kwargs))
+        self.lazy_views = []
+
+
+    def add_lazy_view(self, view_class, *args, **kwargs):
+        if self.enabled is None:
+            self.lazy_views.append((view_class, args, kwargs))
+        elif self.enabled:
+            self.add_view(view_class(*args, **kwargs))
@@ -4,4 +4,4 @@ __author__ = 'SALAR'
 
 class SubmissionView(BaseView):
     can_create = False
-    form_excluded_columns = ['submitted_at', ]
+    form_excluded_columns = ['submitted_at', 'code_key', 'code_hash']
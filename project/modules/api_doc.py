@@ -3,15 +3,19 @@ __author__ = 'AminHP'
 
 # python imports
 import os
-
-# flask imports
-from flasgger import Swagger
+from functools import wraps
 
 
 class ApiDoc(object):
+    """
+    Flasgger docs, off with API_DOC_ENABLED = False (flasgger isn't imported).
+    Flasgger parses every view docstring on each hit of a spec, the specs
+    are built on the first hit and kept for the life of the process.
+    """
+
     def __init__(self, app=None):
         self.app = app
-        self.swagger = Swagger()
+        self.swagger = None
 
         if app:
             self.init_app(app)
@@ -19,14 +23,34 @@ class ApiDoc(object):
 
     def init_app(self, app):
         self.app = app
+        if not app.config['API_DOC_ENABLED']:
+            return
 
+        from flasgger import Swagger
         app.config['SWAGGER'] = {
             "swagger_version": "2.0",
             "headers": [],
             "specs": self.get_specs()
         }
+        self.swagger = Swagger()
         self.swagger.init_app(self.app)
 
+        blueprint = self.swagger.config.get('endpoint', 'swagger')
+        for endpoint in self.swagger.endpoints:
+            name = '%s.%s' % (blueprint, endpoint)
+            app.view_functions[name] = self.cached_view(app.view_functions[name])
+
+
+    def cached_view(self, view):
+        responses = {}
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if 'data' not in responses:
+                responses['data'] = view(*args, **kwargs).get_data()
+            return self.app.response_class(responses['data'], mimetype='application/json')
+        return wrapper
+
 
     def get_specs(self):
 
@@ -2,13 +2,55 @@
 __author__ = 'AminHP'
 
 # python imports
+import time
+import hashlib
 from functools import wraps
+from bson import BSON
+from itsdangerous import URLSafeSerializer, BadData
+from redis.exceptions import RedisError
+from mongoengine import DoesNotExist
 
 # flask imports
 from flask import request, abort, g
+from flask.ctx import _AppCtxGlobals
 from uuid import uuid4
 
 
+class BloomFilter(object):
+    def __init__(self, items, bits_per_item=10, hashes=7):
+        self.size = max(1024, len(items) * bits_per_item)
+        self.hashes = hashes
+        self.bits = bytearray(self.size // 8 + 1)
+        for item in items:
+            for i in self._indexes(item):
+                self.bits[i >> 3] |= 1 << (i & 7)
+
+    def _indexes(self, item):
+        digest = hashlib.md5(item).hexdigest()
+        h1, h2 = int(digest[:16], 16), int(digest[16:], 16)
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item):
+        return all(self.bits[i >> 3] & (1 << (i & 7)) for i in self._indexes(item))
+
+
+class AuthGlobals(_AppCtxGlobals):
+    auth = None
+
+    @property
+    def user(self):
+        """
+        Current user, loaded on first access and kept for the rest of the request.
+        A valid token of a deleted user is rejected like an invalid token.
+        """
+        if not hasattr(self, '_user'):
+            try:
+                self._user = self.auth.load_user(self.user_id)
+            except DoesNotExist:
+                return abort(401, "Token is invalid or has expired")
+        return self._user
+
+
 class Auth(object):
     def __init__(self, redis_connection, app=None):
         self.redis = redis_connection
@@ -20,16 +62,106 @@ class Auth(object):
     def init_app(self, app):
         self.app = app
         self.token_expire_time = self.app.config['TOKEN_EXPIRE_TIME']
+        self.user_cache_timeout = self.app.config['USER_CACHE_TIMEOUT']
+        self.signed_tokens = self.app.config['TOKEN_MODE'] == 'signed'
+        if self.signed_tokens and not self.app.config['TOKEN_SECRET_KEY']:
+            raise ValueError("TOKEN_SECRET_KEY must be set for signed tokens")
+        self.signer = URLSafeSerializer(self.app.config['TOKEN_SECRET_KEY'], salt='access-token')
+        self.revocation_refresh = self.app.config['TOKEN_REVOCATION_REFRESH']
+        self.revoked = BloomFilter([])
+        self.revoked_loaded_at = 0
+
+        AuthGlobals.auth = self
+        app.app_ctx_globals_class = AuthGlobals
 
 
     def generate_token(self, user_id):
+        if self.signed_tokens:
+            return self.signer.dumps(dict(
+                u=str(user_id),
+                j=uuid4().hex[:16],
+                e=int(time.time()) + self.token_expire_time
+            ))
+
         token = str(uuid4())
         self.redis.setex(token, user_id, self.token_expire_time)
         return token
 
 
     def expire_token(self):
-        self.redis.delete(request.headers['Access-Token'])
+        token = request.headers['Access-Token']
+        claims = self._signed_claims(token)
+        if claims:
+            self.redis.zadd('auth:revoked', **{claims['j']: claims['e']})
+            self.redis.zremrangebyscore('auth:revoked', '-inf', time.time())
+            self.revoked_loaded_at = 0
+        else:
+            self.redis.delete(token)
+
+
+    def _signed_claims(self, token):
+        # tokens issued in redis mode are plain uuids, they have no dot
+        if not self.signed_tokens or '.' not in token:
+            return None
+        try:
+            return self.signer.loads(token)
+        except BadData:
+            return None
+
+
+    def is_revoked(self, jti):
+        now = time.time()
+        if now - self.revoked_loaded_at >= self.revocation_refresh:
+            # while redis is down the last filter is used, tried again after the refresh time
+            self.revoked_loaded_at = now
+            try:
+                self.revoked = BloomFilter(self.redis.zrangebyscore('auth:revoked', now, '+inf'))
+            except RedisError as e:
+                self.app.logger.warning('Revoked tokens are not reloaded: %s' % e)
+        if jti not in self.revoked:
+            return False
+        try:
+            return self.redis.zscore('auth:revoked', jti) is not None
+        except RedisError:
+            # most tokens in the filter are revoked
+            return True
+
+
+    def get_user_id(self, token):
+        claims = self._signed_claims(token)
+        if claims:
+            if claims['e'] < time.time() or self.is_revoked(claims['j']):
+                return None
+            return claims['u']
+        if self.signed_tokens and '.' in token:
+            return None
+        return self.redis.get(token)
+
+
+    def load_user(self, user_id):
+        from project.models.user import User
+
+        key = 'user:%s' % user_id
+        try:
+            data = self.redis.get(key)
+        except RedisError as e:
+            self.app.logger.warning('User cache is not available: %s' % e)
+            return User.objects.get(pk=user_id)
+        if data:
+            return User._from_son(BSON(data).decode())
+
+        user_obj = User.objects.get(pk=user_id)
+        son = user_obj.to_mongo()
+        son.pop('password', None)
+        try:
+            self.redis.setex(key, BSON.encode(son), self.user_cache_timeout)
+        except RedisError:
+            pass
+        return user_obj
+
+
+    def forget_user(self, user_id):
+        self.redis.delete('user:%s' % user_id)
 
 
     def authenticate(self, f):
@@ -40,7 +172,7 @@ class Auth(object):
                 return abort(401, "Set token to access protected routes")
 
             token = request.headers['Access-Token']
-            user_id = self.redis.get(token)
+            user_id = self.get_user_id(token)
 
             if not user_id:
                 return abort(401, "Token is invalid or has expired")
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import time
+from collections import defaultdict
+
+# flask imports
+from flask import has_app_context
+from redis import RedisError
+
+# project imports
+from project import app
+from project.extensions import cache, redis
+
+
+STATS_KEY = 'cache:stats'
+
+# hits and misses are counted in the process and added to redis every
+# CACHE_STATS_FLUSH_INTERVAL seconds, so a cache hit stays one round trip
+_counts = defaultdict(int)
+_flushed_at = [time.time()]
+
+
+def get(name, key, build, timeout=None):
+    """
+    Returns the cached value of key, or builds and caches it.
+    Nothing is cached if build returns None.
+    """
+    value = cache.get(key)
+    _count(name, int(value is not None), int(value is None))
+    if value is None:
+        value = build()
+        if value is not None:
+            cache.set(key, value, timeout=timeout)
+    return value
+
+
+def get_many(name, key_format, ids, build, timeout=None):
+    """
+    Returns {id: value} of ids, build(missing ids) returns {id: value} of the
+    missing ones. Hits and misses are counted under name.
+    timeout can be a function of the value, for values which expire at
+    different times.
+    """
+    ids = list(ids)
+    if not ids:
+        return {}
+    values = cache.get_many(*[key_format % i for i in ids])
+
+    result = dict((i, v) for i, v in zip(ids, values) if v is not None)
+    missing = [i for i in ids if i not in result]
+    _count(name, len(result), len(missing))
+
+    if missing:
+        built = dict((i, v) for i, v in build(missing).items() if v is not None)
+        if callable(timeout):
+            for i, v in built.items():
+                cache.set(key_format % i, v, timeout=timeout(v))
+        elif built:
+            cache.set_many(dict((key_format % i, v) for i, v in built.items()), timeout=timeout)
+        result.update(built)
+    return result
+
+
+def delete(*keys):
+    """
+    Models are also saved by manager commands, out of an app context.
+    """
+    if has_app_context():
+        cache.delete_many(*keys)
+    else:
+        with app.app_context():
+            cache.delete_many(*keys)
+
+
+def stats():
+    """
+    Returns {name: {'hits': n, 'misses': n}} since the last reset, counts
+    of the processes are added every CACHE_STATS_FLUSH_INTERVAL seconds.
+    """
+    result = {}
+    for field, value in redis.hgetall(STATS_KEY).items():
+        name, kind = field.rsplit(':', 1)
+        result.setdefault(name, {'hits': 0, 'misses': 0})[kind] = int(value)
+    return result
+
+
+def reset_stats():
+    redis.delete(STATS_KEY)
+
+
+def flush_stats():
+    counts = dict(_counts)
+    _counts.clear()
+    _flushed_at[0] = time.time()
+    if not counts:
+        return
+    pipe = redis.pipeline(transaction=False)
+    for field, value in counts.items():
+        pipe.hincrby(STATS_KEY, field, value)
+    try:
+        pipe.execute()
+    except RedisError:
+        app.logger.warning("Cache stats were not saved", exc_info=True)
+
+
+def _count(name, hits, misses):
+    if hits:
+        _counts[name + ':hits'] += hits
+    if misses:
+        _counts[name + ':misses'] += misses
+    if time.time() - _flushed_at[0] >= app.config['CACHE_STATS_FLUSH_INTERVAL']:
+        flush_stats()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import os
+import struct
+from io import BytesIO
+from bson import ObjectId
+
+
+class CodePack(object):
+    """
+    Per contest packed storage of submission codes.
+    <cid>.pack is an append-only concatenation of code files and <cid>.idx is
+    a sorted table of fixed size records (submission id, offset, length).
+    """
+
+    record = struct.Struct('<12sQL')
+
+    def __init__(self, app=None):
+        self.app = app
+        if app:
+            self.init_app(app)
+
+
+    def init_app(self, app):
+        self.dir = app.config['SUBMISSION_PACK_DIR']
+        self.app = app
+
+
+    def pack_path(self, cid):
+        return os.path.join(self.dir, '%s.pack' % cid)
+
+
+    def index_path(self, cid):
+        return os.path.join(self.dir, '%s.idx' % cid)
+
+
+    def _read_index(self, cid):
+        path = self.index_path(cid)
+        if not os.path.exists(path):
+            return []
+        with open(path, 'rb') as f:
+            data = f.read()
+        size = self.record.size
+        return [self.record.unpack_from(data, i) for i in range(0, len(data), size)]
+
+
+    def _find(self, cid, sid):
+        key = ObjectId(str(sid)).binary
+        size = self.record.size
+        with open(self.index_path(cid), 'rb') as f:
+            lo, hi = 0, os.fstat(f.fileno()).st_size // size
+            while lo < hi:
+                mid = (lo + hi) // 2
+                f.seek(mid * size)
+                oid, offset, length = self.record.unpack(f.read(size))
+                if oid == key:
+                    return offset, length
+                if oid < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        raise IOError("Code of submission %s is not in the pack" % sid)
+
+
+    def read(self, cid, sid):
+        offset, length = self._find(cid, sid)
+        with open(self.pack_path(cid), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+
+    def open(self, cid, sid):
+        return BytesIO(self.read(cid, sid))
+
+
+    def add(self, cid, blobs):
+        """
+        Appends (sid, fileobj) pairs to the pack of the contest.
+        The index is replaced atomically after the pack is flushed to disk.
+        """
+        records = dict((r[0], r) for r in self._read_index(cid))
+
+        with open(self.pack_path(cid), 'ab') as pack:
+            pack.seek(0, os.SEEK_END)
+            offset = pack.tell()
+            for sid, fileobj in blobs:
+                length = 0
+                for data in iter(lambda: fileobj.read(64 * 1024), ''):
+                    pack.write(data)
+                    length += len(data)
+                key = ObjectId(str(sid)).binary
+                records[key] = (key, offset, length)
+                offset += length
+            pack.flush()
+            os.fsync(pack.fileno())
+
+        tmp_path = '%s.tmp' % self.index_path(cid)
+        with open(tmp_path, 'wb') as f:
+            for key in sorted(records):
+                f.write(self.record.pack(*records[key]))
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, self.index_path(cid))
+
+
+    def remove(self, cid):
+        for path in (self.pack_path(cid), self.index_path(cid)):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import os
+import json
+import hashlib
+import shutil
+import zipfile
+import tempfile
+from bson import json_util, ObjectId
+
+# project imports
+from project import app
+from project.modules.zipstream import ZipStream
+from project.models.contest import Contest, Problem, Result
+from project.models.membership import Membership
+from project.models.submission import Submission
+from project.models.team import Team
+from project.models.user import User
+
+
+VERSION = 1
+DOCS_PER_CHUNK = 500
+FILE_PART_SIZE = 64 * 1024 * 1024
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class ContestArchiveError(Exception):
+    pass
+
+
+class _LimitedReader(object):
+
+    def __init__(self, fileobj, limit):
+        self.fileobj = fileobj
+        self.left = limit
+
+    def read(self, size):
+        if self.left <= 0:
+            return ''
+        data = self.fileobj.read(min(size, self.left))
+        self.left -= len(data)
+        return data
+
+
+class _StringReader(object):
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, size):
+        data = self.data[self.pos:self.pos + size]
+        self.pos += len(data)
+        return data
+
+
+class _HashingReader(object):
+
+    def __init__(self, fileobj, sha):
+        self.fileobj = fileobj
+        self.sha = sha
+
+    def read(self, size):
+        data = self.fileobj.read(size)
+        self.sha.update(data)
+        return data
+
+
+class ContestExporter(object):
+    """
+    Streams a contest with all of its documents and files into one zip archive.
+    Documents are written as json lines in chunks of DOCS_PER_CHUNK and files
+    in parts of FILE_PART_SIZE, so documents and file contents are never held
+    in memory. Memory still grows by one small record per file part (the zip
+    central directory and the file list of the manifest, both written at the
+    end), i.e. it is O(files) and not O(contest size).
+    """
+
+    def __init__(self, contest_id):
+        self.contest = Contest._get_collection().find_one({'_id': ObjectId(contest_id)})
+        if not self.contest:
+            raise ContestArchiveError("Contest does not exist")
+        self.stream = ZipStream()
+        self.manifest = dict(version=VERSION, contest=str(self.contest['_id']), documents={}, files=[])
+
+    def write(self, fileobj):
+        for chunk in self:
+            fileobj.write(chunk)
+
+    def __iter__(self):
+        contest = self.contest
+        team_ids = contest.get('pending_teams', []) + contest.get('accepted_teams', [])
+        problem_ids = contest.get('problems', [])
+
+        user_ids = set([contest['owner']] + contest.get('admins', []))
+        for t in Team._get_collection().find({'_id': {'$in': team_ids}}, {'owner': 1, 'members': 1}):
+            user_ids.add(t['owner'])
+            user_ids.update(t.get('members', []))
+        user_ids.update(Submission._get_collection().distinct('user', {'contest': contest['_id']}))
+
+        collections = [
+            ('users', User, {'_id': {'$in': sorted(user_ids)}}),
+            ('teams', Team, {'_id': {'$in': team_ids}}),
+            ('problems', Problem, {'_id': {'$in': problem_ids}}),
+            ('results', Result, {'_id': contest.get('result')}),
+            ('contests', Contest, {'_id': contest['_id']}),
+            ('submissions', Submission, {'contest': contest['_id']})
+        ]
+        for name, model, query in collections:
+            for chunk in self._write_documents(name, model, query):
+                yield chunk
+
+        for pid in problem_ids:
+            problem_obj = Problem(pk=pid)
+            for chunk in self._write_file('problems/%s' % pid, problem_obj.body_path):
+                yield chunk
+            for root, dirnames, filenames in os.walk(problem_obj.testcase_dir):
+                for filename in sorted(filenames):
+                    path = os.path.join(root, filename)
+                    rel = os.path.relpath(path, problem_obj.testcase_dir)
+                    for chunk in self._write_file('testcases/%s/%s' % (pid, rel), path):
+                        yield chunk
+
+        cursor = Submission._get_collection().find({'contest': contest['_id']})
+        for doc in cursor:
+            submission_obj = Submission._from_son(doc, _auto_dereference=False)
+            try:
+                fileobj = submission_obj.open_code()
+            except IOError:
+                continue
+            with fileobj:
+                for chunk in self._write_stream('submissions/%s' % doc['_id'], fileobj):
+                    yield chunk
+
+        data = json.dumps(self.manifest)
+        for chunk in self.stream.add('manifest.json', _StringReader(data)):
+            yield chunk
+        for chunk in self.stream.finish():
+            yield chunk
+
+    def _write_documents(self, name, model, query):
+        cursor = model._get_collection().find(query)
+        lines, index, count = [], 0, 0
+        for doc in cursor:
+            lines.append(json_util.dumps(doc))
+            count += 1
+            if len(lines) == DOCS_PER_CHUNK:
+                for chunk in self._write_lines(name, index, lines):
+                    yield chunk
+                lines, index = [], index + 1
+        if lines:
+            for chunk in self._write_lines(name, index, lines):
+                yield chunk
+            index += 1
+        self.manifest['documents'][name] = dict(count=count, chunks=index)
+
+    def _write_lines(self, name, index, lines):
+        arcname = 'documents/%s/%05d.jsonl' % (name, index)
+        for chunk in self.stream.add(arcname, _StringReader('\n'.join(lines))):
+            yield chunk
+
+    def _write_file(self, name, path):
+        if not os.path.isfile(path):
+            return
+        with open(path, 'rb') as f:
+            for chunk in self._write_stream(name, f):
+                yield chunk
+
+    def _write_stream(self, name, fileobj):
+        parts = []
+        sha = hashlib.sha256()
+        reader = _HashingReader(fileobj, sha)
+        while True:
+            arcname = 'files/%s.%05d' % (name, len(parts))
+            for chunk in self.stream.add(arcname, _LimitedReader(reader, FILE_PART_SIZE)):
+                yield chunk
+            entry = self.stream.entries[-1]
+            parts.append(dict(name=arcname, size=entry['size'], sha256=entry['sha256']))
+            if entry['size'] < FILE_PART_SIZE:
+                break
+
+        size = sum(p['size'] for p in parts)
+        self.manifest['files'].append(dict(path=name, size=size, sha256=sha.hexdigest(), parts=parts))
+
+
+class ContestImporter(object):
+    """
+    Loads a contest archive made by ContestExporter.
+    Users are matched by username and teams by name, other documents keep
+    their ids. File paths of the manifest are checked and every file part is
+    checked against its checksum into a staging directory before any
+    document is inserted, and the inserted documents and moved files are
+    removed if the import fails later.
+    """
+
+    def __init__(self, path):
+        self.zf = zipfile.ZipFile(path, allowZip64=True)
+        try:
+            self.manifest = json.loads(self.zf.read('manifest.json'))
+        except KeyError:
+            raise ContestArchiveError("Archive has no manifest")
+        if self.manifest.get('version') != VERSION:
+            raise ContestArchiveError("Unsupported archive version")
+        self.id_map = {}
+        self.inserted = []
+        self.moved = []
+
+    def run(self):
+        contest_id = ObjectId(self.manifest['contest'])
+        contest = next(self._documents('contests'))
+        query = {'$or': [{'_id': contest_id}, {'name': contest['name']}]}
+        if Contest._get_collection().find_one(query, {'_id': 1}):
+            raise ContestArchiveError("Contest already exists")
+
+        for f in self.manifest['files']:
+            self._check_path(f['path'])
+
+        staging_dir = tempfile.mkdtemp(dir=app.config['TEMP_DIR'])
+        try:
+            staged = []
+            for index, f in enumerate(self.manifest['files']):
+                path = os.path.join(staging_dir, str(index))
+                self._extract(f, path)
+                staged.append((f, path))
+
+            try:
+                self._import(contest_id, staged)
+            except Exception:
+                self._rollback(contest_id)
+                raise
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        return contest_id
+
+    def _import(self, contest_id, staged):
+        for doc in self._documents('users'):
+            self._import_user(doc)
+        for doc in self._documents('teams'):
+            self._import_team(doc)
+        for doc in self._documents('problems'):
+            self._insert(Problem, self._remap(doc))
+        for doc in self._documents('results'):
+            # team ids are kept as strings in results
+            self._insert(Result, self._remap(doc, strings=True))
+        for doc in self._documents('contests'):
+            self._insert(Contest, self._remap(doc))
+        Membership.sync_contest(contest_id)
+
+        submission_paths = {}
+        for doc in self._documents('submissions'):
+            doc = self._remap(doc)
+            submission_obj = Submission._from_son(doc, _auto_dereference=False)
+            doc['code_key'] = submission_obj.make_code_key()
+            doc['code_packed'] = False
+            self._insert(Submission, doc)
+            submission_paths[str(doc['_id'])] = os.path.join(app.config['SUBMISSION_DIR'], doc['code_key'])
+
+        moves = []
+        for f, path in staged:
+            kind, rest = f['path'].split('/', 1)
+            if kind == 'problems':
+                dest, root = Problem(pk=rest).body_path, app.config['PROBLEM_DIR']
+            elif kind == 'testcases':
+                pid, rel = rest.split('/', 1)
+                root = Problem(pk=pid).testcase_dir
+                dest = os.path.join(root, rel)
+            else:
+                dest, root = submission_paths[rest], os.path.join(app.config['SUBMISSION_DIR'], str(contest_id))
+            if not self._is_inside(dest, root):
+                raise ContestArchiveError("Invalid file path: %s" % f['path'])
+            moves.append((path, dest))
+
+        for path, dest in moves:
+            directory = os.path.dirname(dest)
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            shutil.move(path, dest)
+            self.moved.append(dest)
+
+    @staticmethod
+    def _check_path(path):
+        parts = path.split('/')
+        kind, ids = parts[0], parts[1:2]
+        if kind == 'testcases':
+            rel = '/'.join(parts[2:])
+            if not rel or os.path.isabs(rel) or '..' in rel.split('/'):
+                raise ContestArchiveError("Invalid file path: %s" % path)
+        elif kind not in ('problems', 'submissions') or len(parts) != 2:
+            raise ContestArchiveError("Invalid file path: %s" % path)
+        if not ids or not ObjectId.is_valid(ids[0]):
+            raise ContestArchiveError("Invalid file path: %s" % path)
+
+    @staticmethod
+    def _is_inside(path, root):
+        # paths are joined to root, the rest may not go up or be absolute
+        root = root.rstrip(os.sep) + os.sep
+        if not path.startswith(root):
+            return False
+        return not set(path[len(root):].split(os.sep)) & {'', '.', '..'}
+
+    def _insert(self, model, doc):
+        model._get_collection().insert_one(doc)
+        self.inserted.append((model, doc['_id']))
+
+    def _rollback(self, contest_id):
+        for model, _id in reversed(self.inserted):
+            model._get_collection().delete_one({'_id': _id})
+        Membership._get_collection().delete_many({'contest': contest_id})
+        for path in self.moved:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _documents(self, name):
+        info = self.manifest['documents'].get(name, {})
+        for index in range(info.get('chunks', 0)):
+            with self.zf.open('documents/%s/%05d.jsonl' % (name, index)) as f:
+                for line in f:
+                    if line.strip():
+                        yield json_util.loads(line)
+
+    def _remap(self, value, strings=False):
+        if isinstance(value, ObjectId):
+            return self.id_map.get(value, value)
+        if isinstance(value, list):
+            return [self._remap(v, strings) for v in value]
+        if isinstance(value, dict):
+            return dict((self._remap(k, strings), self._remap(v, strings)) for k, v in value.items())
+        if strings and isinstance(value, basestring) and ObjectId.is_valid(value):
+            return str(self.id_map.get(ObjectId(value), value))
+        return value
+
+    def _import_user(self, doc):
+        existing = User._get_collection().find_one({'username': doc['username']}, {'_id': 1})
+        if existing:
+            self.id_map[doc['_id']] = existing['_id']
+        else:
+            self._insert(User, doc)
+
+    def _import_team(self, doc):
+        existing = Team._get_collection().find_one({'name': doc['name']}, {'_id': 1})
+        if existing:
+            self.id_map[doc['_id']] = existing['_id']
+        else:
+            self._insert(Team, self._remap(doc))
+
+    def _extract(self, f, dest):
+        directory = os.path.dirname(dest)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        sha = hashlib.sha256()
+        with open(dest, 'wb') as out:
+            for part in f['parts']:
+                part_sha = hashlib.sha256()
+                with self.zf.open(part['name']) as src:
+                    for data in iter(lambda: src.read(COPY_CHUNK_SIZE), ''):
+                        part_sha.update(data)
+                        sha.update(data)
+                        out.write(data)
+                if part_sha.hexdigest() != part['sha256']:
+                    raise ContestArchiveError("Checksum mismatch: %s" % part['name'])
+
+        if sha.hexdigest() != f['sha256']:
+            raise ContestArchiveError("Checksum mismatch: %s" % f['path'])
@@ -4,8 +4,30 @@ __author__ = 'AminHP'
 # python imports
 from time import time
 
+# flask imports
+from flask import g, has_request_context
+
 
 def utcnowts(microseconds=False):
     if microseconds:
         return time()
     return int(time())
+
+
+def request_nowts():
+    """
+    utcnowts fixed at its first call in a request, so all the time flags of
+    a response are computed from the same second.
+    """
+    if not has_request_context():
+        return utcnowts()
+    if not hasattr(g, 'nowts'):
+        g.nowts = utcnowts()
+    return g.nowts
+
+
+def boundary_timeout(timeout, now, *boundaries):
+    """
+    Shortens timeout to end at the first boundary after now.
+    """
+    return min([timeout] + [b - now for b in boundaries if b > now])
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import json
+
+# flask imports
+from flask import current_app
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def _ujson_dumps(obj):
+    return ujson.dumps(obj, escape_forward_slashes=False)
+
+
+ENCODERS = {
+    'json': _json_dumps,
+    'ujson': _ujson_dumps if ujson else None,
+    'auto': _ujson_dumps if ujson else _json_dumps
+}
+
+
+def dumps(obj, encoder=None):
+    """
+    Encodes obj with JSON_ENCODER (auto uses ujson when it's installed).
+    """
+    encoder = encoder or current_app.config['JSON_ENCODER']
+    func = ENCODERS[encoder]
+    if func is None:
+        raise ValueError("JSON encoder %s is not installed" % encoder)
+    return func(obj)
+
+
+def json_response(data, status=200):
+    """
+    A json response of already encoded data, e.g. from a cache.
+    """
+    return current_app.response_class(data, status=status, mimetype='application/json')
+
+
+def jsonify(*args, **kwargs):
+    """
+    Same as flask.jsonify, but compact and with the configured encoder.
+    """
+    return json_response(dumps(dict(*args, **kwargs)))
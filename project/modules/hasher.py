@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import time
+import socket
+import multiprocessing
+from uuid import uuid4
+from passlib.context import CryptContext
+
+
+class PasswordBusyError(Exception):
+    pass
+
+
+class PasswordHasher(object):
+    """
+    Password hashing with configurable schemes and rounds.
+    Hashes of a deprecated scheme or below the minimum rounds are reported by
+    verify_and_update. The number of simultaneous hash computations of the
+    processes of one host may be limited to PASSWORD_MAX_CONCURRENCY, at most
+    PASSWORD_QUEUE_LENGTH requests wait for a slot in arrival order.
+    """
+
+    slots_key = 'password:slots:%s'
+    slot_timeout = 10
+    poll_interval = 0.01
+    hash_time = 0.1 # estimated seconds of one hash, updated by measured times
+
+    def __init__(self, redis_connection, app=None):
+        self.redis = redis_connection
+        self.app = app
+        if app:
+            self.init_app(app)
+
+
+    def init_app(self, app):
+        self.app = app
+        self.max_concurrency = app.config['PASSWORD_MAX_CONCURRENCY']
+        if self.max_concurrency == 'cpu':
+            self.max_concurrency = multiprocessing.cpu_count()
+        self.queue_length = app.config['PASSWORD_QUEUE_LENGTH']
+        self.slots_key = self.slots_key % socket.gethostname()
+        self.context = self.make_context(
+            app.config['PASSWORD_SCHEMES'],
+            app.config['PASSWORD_ROUNDS'],
+            app.config['PASSWORD_MIN_ROUNDS']
+        )
+
+
+    @staticmethod
+    def make_context(schemes, rounds, min_rounds=None):
+        kwargs = dict(schemes=schemes, default=schemes[0], deprecated=schemes[1:])
+        for scheme, r in rounds.items():
+            kwargs['%s__default_rounds' % scheme] = r
+        for scheme, r in (min_rounds or {}).items():
+            kwargs['%s__min_rounds' % scheme] = r
+        return CryptContext(**kwargs)
+
+
+    def hash(self, password):
+        with self._slot():
+            return self.context.encrypt(password)
+
+
+    def verify(self, password, hash):
+        with self._slot():
+            return self.context.verify(password, hash)
+
+
+    def verify_and_update(self, password, hash):
+        """
+        Returns (valid, new_hash), new_hash is None if the hash matches the policy.
+        """
+        with self._slot():
+            return self.context.verify_and_update(password, hash)
+
+
+    def _slot(self):
+        return _Slot(self)
+
+
+    @property
+    def wait_timeout(self):
+        # the last request of a full queue waits for this many rounds of hashing
+        return self.hash_time * (self.queue_length // self.max_concurrency + 1)
+
+
+    def _acquire(self, token):
+        now = time.time()
+        deadline = now + self.wait_timeout
+        pipe = self.redis.pipeline()
+        pipe.zremrangebyscore(self.slots_key, '-inf', now - self.slot_timeout)
+        pipe.zadd(self.slots_key, **{token: now})
+        pipe.zrank(self.slots_key, token)
+        rank = pipe.execute()[2]
+        if rank >= self.max_concurrency + self.queue_length:
+            self._release(token)
+            raise PasswordBusyError()
+
+        # the token keeps its arrival time, so waiting requests get slots in order
+        while rank >= self.max_concurrency:
+            if time.time() + self.poll_interval > deadline:
+                self._release(token)
+                raise PasswordBusyError()
+            time.sleep(self.poll_interval)
+            rank = self.redis.zrank(self.slots_key, token)
+            if rank is None:
+                # removed as stale, wait again at the end of the queue
+                self.redis.zadd(self.slots_key, **{token: time.time()})
+                rank = self.redis.zrank(self.slots_key, token)
+
+
+    def _release(self, token):
+        self.redis.zrem(self.slots_key, token)
+
+
+    def _measured(self, seconds):
+        self.hash_time = 0.8 * self.hash_time + 0.2 * seconds
+
+
+class _Slot(object):
+    def __init__(self, hasher):
+        self.hasher = hasher
+        self.token = None
+        self.started = None
+
+    def __enter__(self):
+        if self.hasher.max_concurrency:
+            self.token = uuid4().hex
+            self.hasher._acquire(self.token)
+            self.started = time.time()
+
+    def __exit__(self, exc_type, *args):
+        if self.token:
+            self.hasher._release(self.token)
+            if exc_type is None:
+                self.hasher._measured(time.time() - self.started)
@@ -1,10 +1,31 @@
 # -*- coding: utf-8 -*-
 __author__ = 'AminHP'
 
+# python imports
+import time
+import random
+
 from .core import run
 from .types import JudgementStatusType
 
 
-def judge(code_path, prog_lang, testcase_dir, time_limit, space_limit):
-    status, reason = run(code_path, prog_lang.name, testcase_dir, time_limit, space_limit)
+def judge(code_path, prog_lang, testcase_dir, time_limit, space_limit, sandbox='docker', timings=None):
+    status, reason = run(code_path, prog_lang.name, testcase_dir, time_limit, space_limit, sandbox, timings)
     return status, reason
+
+
+FAKE_STATUSES = [
+    JudgementStatusType.Accepted,
+    JudgementStatusType.WrongAnswer,
+    JudgementStatusType.WrongAnswer,
+    JudgementStatusType.TimeExceeded,
+    JudgementStatusType.CompileError
+]
+
+
+def fake_judge(code_path, prog_lang, testcase_dir, time_limit, space_limit, delay=(0.2, 1.5)):
+    """
+    Takes a random time of delay range and returns a random status, for load tests.
+    """
+    time.sleep(random.uniform(*delay))
+    return random.choice(FAKE_STATUSES), None
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import os
+import time
+import shutil
+import tempfile
+
+# project imports
+from .core import run
+from .types import ProgrammingLanguageType
+
+
+# reference solutions read n and print one line (or n lines for output)
+CASES = {
+    'hello': dict(
+        input='1\n',
+        output=lambda n: 'Hello World'
+    ),
+    'cpu': dict(
+        input='5000000\n',
+        output=lambda n: str(n // 7 * 21 + sum(range(n % 7)))
+    ),
+    'memory': dict(
+        input='10000000\n',
+        output=lambda n: str(n // 10 * 45 + sum(range(n % 10)))
+    ),
+    'output': dict(
+        input='100000\n',
+        output=lambda n: '\n'.join(str(i) for i in xrange(n))
+    )
+}
+
+CPP = {
+    'hello': '#include <cstdio>\nint main() { int n; scanf("%d", &n); printf("Hello World\\n"); }\n',
+    'cpu': '#include <cstdio>\nint main() { long long n, s = 0; scanf("%lld", &n);'
+           ' for (long long i = 0; i < n; i++) s += i % 7; printf("%lld\\n", s); }\n',
+    'memory': '#include <cstdio>\n#include <vector>\nint main() { int n; scanf("%d", &n);'
+              ' std::vector<int> a(n); for (int i = 0; i < n; i++) a[i] = i % 10;'
+              ' long long s = 0; for (int i = 0; i < n; i++) s += a[i]; printf("%lld\\n", s); }\n',
+    'output': '#include <cstdio>\nint main() { int n; scanf("%d", &n);'
+              ' for (int i = 0; i < n; i++) printf("%d\\n", i); }\n'
+}
+
+# the same sources run on python 2 and 3
+PY_RANGE = 'try:\n    range = xrange\nexcept NameError:\n    pass\n'
+
+PYTHON = {
+    'hello': 'n = int(input())\nprint("Hello World")\n',
+    'cpu': PY_RANGE + 'n = int(input())\ns = 0\nfor i in range(n):\n    s += i % 7\nprint(s)\n',
+    'memory': PY_RANGE + 'n = int(input())\na = [i % 10 for i in range(n)]\nprint(sum(a))\n',
+    'output': PY_RANGE + 'import sys\nn = int(input())\nsys.stdout.write("\\n".join(str(i) for i in range(n)) + "\\n")\n'
+}
+
+JAVA = {
+    'hello': 'public class Main { public static void main(String[] a) {'
+             ' new java.util.Scanner(System.in).nextInt(); System.out.println("Hello World"); } }\n',
+    'cpu': 'public class Main { public static void main(String[] a) {'
+           ' long n = new java.util.Scanner(System.in).nextLong(), s = 0;'
+           ' for (long i = 0; i < n; i++) s += i % 7; System.out.println(s); } }\n',
+    'memory': 'public class Main { public static void main(String[] a) {'
+              ' int n = new java.util.Scanner(System.in).nextInt(); int[] b = new int[n];'
+              ' for (int i = 0; i < n; i++) b[i] = i % 10; long s = 0;'
+              ' for (int i = 0; i < n; i++) s += b[i]; System.out.println(s); } }\n',
+    'output': 'public class Main { public static void main(String[] a) {'
+              ' int n = new java.util.Scanner(System.in).nextInt(); StringBuilder b = new StringBuilder();'
+              ' for (int i = 0; i < n; i++) b.append(i).append(\'\\n\'); System.out.print(b); } }\n'
+}
+
+SOLUTIONS = {
+    ProgrammingLanguageType.Cpp: ('main.cpp', CPP),
+    ProgrammingLanguageType.Cpp11: ('main.cpp', CPP),
+    ProgrammingLanguageType.Python27: ('main.py', PYTHON),
+    ProgrammingLanguageType.Python35: ('main.py', PYTHON),
+    ProgrammingLanguageType.Java8: ('Main.java', JAVA)
+}
+
+TIME_LIMIT = 10
+SPACE_LIMIT = 256
+
+
+def make_case(directory, case, testcases):
+    """
+    A testcase directory of case with the same input in each testcase.
+    """
+    testcase_dir = os.path.join(directory, 'testcases')
+    for sub in ('inputs', 'outputs'):
+        os.makedirs(os.path.join(testcase_dir, sub))
+    data = CASES[case]
+    output = data['output'](int(data['input']))
+    for i in range(1, testcases + 1):
+        with open(os.path.join(testcase_dir, 'inputs', str(i)), 'w') as f:
+            f.write(data['input'])
+        with open(os.path.join(testcase_dir, 'outputs', str(i)), 'w') as f:
+            f.write(output + '\n')
+    return testcase_dir
+
+
+def run_one(prog_lang, case, testcases=3, sandbox='docker'):
+    """
+    Judges the reference solution of case, returns its status and timings.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        filename, sources = SOLUTIONS[prog_lang]
+        code_dir = os.path.join(directory, 'code')
+        os.makedirs(code_dir)
+        code_path = os.path.join(code_dir, filename)
+        with open(code_path, 'w') as f:
+            f.write(sources[case])
+
+        timings = {}
+        status, reason = run(
+            code_path, prog_lang.name, make_case(directory, case, testcases),
+            TIME_LIMIT, SPACE_LIMIT, sandbox, timings
+        )
+        return dict(
+            language=prog_lang.name,
+            case=case,
+            sandbox=sandbox,
+            status=status.name,
+            at=int(time.time()),
+            **timings
+        )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_matrix(languages=None, cases=None, repeat=3, testcases=3, sandbox='docker'):
+    """
+    Yields results of every language and case, repeat times each.
+    """
+    languages = languages or list(ProgrammingLanguageType)
+    for prog_lang in languages:
+        for case in cases or sorted(CASES):
+            for i in range(repeat):
+                yield run_one(prog_lang, case, testcases, sandbox)
@@ -6,6 +6,10 @@ import docker
 import os
 import imp
 import re
+import time
+import shutil
+import tempfile
+import subprocess
 
 # project imports
 from .types import JudgementStatusType
@@ -13,9 +17,15 @@ from .types import JudgementStatusType
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 SCRIPTS_DIR = os.path.join(BASE_DIR, 'scripts')
+MAIN_SCRIPT = os.path.join(BASE_DIR, 'main.sh')
 
 
-def run(code_path, prog_lang, testcase_dir, time_limit, space_limit):
+def run(code_path, prog_lang, testcase_dir, time_limit, space_limit, sandbox='docker', timings=None):
+    """
+    Judges a code in the docker container, or with sandbox='process' as a
+    local process without isolation (for CI without docker).
+    timings, if given, is filled with seconds of the steps, see read_timings.
+    """
     prog_lang = prog_lang.lower()
     pl_script_dir = os.path.join(SCRIPTS_DIR, prog_lang)
     input_dir = os.path.join(testcase_dir, 'inputs')
@@ -27,8 +37,17 @@ def run(code_path, prog_lang, testcase_dir, time_limit, space_limit):
 
     time_limit = float(time_limit * config_mod.TIME_LIMIT_FACTOR)
 
-    run_in_container(code_path, pl_script_dir, input_dir, log_dir, time_limit, space_limit)
-    return check_result(log_dir, output_dir, time_limit, space_limit)
+    runner = run_in_process if sandbox == 'process' else run_in_container
+    started = time.time()
+    runner(code_path, pl_script_dir, input_dir, log_dir, time_limit, space_limit)
+    finished = time.time()
+    result = check_result(log_dir, output_dir, time_limit, space_limit)
+
+    if timings is not None:
+        timings.update(read_timings(log_dir, started, finished))
+        timings['check'] = time.time() - finished
+        timings['total'] = time.time() - started
+    return result
 
 
 
@@ -79,6 +98,59 @@ def run_in_container(code_path, pl_script_dir, input_dir, log_dir, time_limit, s
         pass
 
 
+def run_in_process(code_path, pl_script_dir, input_dir, log_dir, time_limit, space_limit):
+    """
+    Runs main.sh as the current user, the space limit is only checked
+    afterwards from the stats of /usr/bin/time.
+    """
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+    compiled_dir = tempfile.mkdtemp()
+
+    env = dict(
+        os.environ,
+        CODE_PATH=code_path,
+        PL_SCRIPT_DIR=pl_script_dir,
+        TESTCASE_DIR=input_dir,
+        LOG_DIR=log_dir,
+        TIME_LIMIT=str(time_limit),
+        COMPILED_DIR=compiled_dir,
+        RUN_AS=''
+    )
+    try:
+        with open(os.devnull, 'w') as devnull:
+            subprocess.call(['/bin/bash', MAIN_SCRIPT], env=env, stdout=devnull, stderr=devnull)
+    finally:
+        shutil.rmtree(compiled_dir, ignore_errors=True)
+
+
+def read_timings(log_dir, started, finished):
+    """
+    Seconds of starting the sandbox, compiling, each testcase and stopping
+    the sandbox, from timing.log of main.sh. Steps which didn't finish
+    (e.g. compile errors) are left out.
+    """
+    marks = []
+    timing_fp = os.path.join(log_dir, 'timing.log')
+    if os.path.exists(timing_fp):
+        for line in open(timing_fp):
+            name, _, ts = line.strip().rpartition(' ')
+            marks.append((name, float(ts)))
+
+    timings = dict(testcases=[])
+    previous = started
+    for name, ts in marks:
+        if name == 'begin':
+            timings['start'] = ts - started
+        elif name == 'compile':
+            timings['compile'] = ts - previous
+        elif name.startswith('testcase:'):
+            timings['testcases'].append(ts - previous)
+        previous = ts
+    timings['stop'] = finished - previous
+    return timings
+
+
 
 def check_result(log_dir, output_dir, time_limit, space_limit):
     compile_error_fp = os.path.join(log_dir, "compile.err")
@@ -3,7 +3,10 @@
 echo "hello!!!"
 set -e
 
-export COMPILED_DIR="/tmp/compiled"
+export COMPILED_DIR="${COMPILED_DIR:-/tmp/compiled}"
+
+# the process sandbox runs codes as the current user (RUN_AS="")
+RUN_AS="${RUN_AS-runuser -u restricted_user}"
 
 
 if [ ! -d "$COMPILED_DIR" ]; then
@@ -28,12 +31,22 @@ if [ ! -d "$LOG_DIR" ]; then
 		mkdir "$LOG_DIR"
 	fi
 
+# timestamps of the steps, for judge benchmarks
+mark() {
+	echo "$1 $(date +%s.%N)" >> "$LOG_DIR/timing.log"
+}
+
+# a rejudge reuses the log directory
+: > "$LOG_DIR/timing.log"
+mark begin
+
 echo "begin compiling"
 
 
 if [ -s "$CODE_PATH" ]; then
 
 	/bin/bash "$PL_SCRIPT_DIR/compile.sh" 2> "$LOG_DIR/compile.err"
+	mark compile
 
 	echo "compiled successfully"
 	echo "begin tests"
@@ -43,8 +56,9 @@ if [ -s "$CODE_PATH" ]; then
 		if [ -s "$tc" ]; then
 			NAME="$(basename $tc)"
 			ulimit -s hard
-			/usr/bin/time -v -o "$LOG_DIR/$NAME.stt" runuser -u restricted_user timeout "$TIME_LIMIT"s \
+			/usr/bin/time -v -o "$LOG_DIR/$NAME.stt" $RUN_AS timeout "$TIME_LIMIT"s \
 				/bin/bash "$PL_SCRIPT_DIR/run.sh" < "$tc" 1> "$LOG_DIR/$NAME.out" 2> "$LOG_DIR/$NAME.err"
+			mark "testcase:$NAME"
 		fi
 	done
 	echo "end of tests"
@@ -58,4 +72,5 @@ if [ -d "COMPILED_DIR" ]; then
 	rm -rf "$COMPILED_DIR/*"
 fi
 
+mark end
 echo "end"
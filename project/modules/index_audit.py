@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import json
+from bson import SON
+from pymongo import monitoring
+
+# a query may examine this many documents per returned one (plus SLACK)
+MAX_EXAMINED_RATIO = 10
+SLACK = 100
+
+RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte', '$ne', '$nin', '$exists'}
+READ_COMMANDS = ('find', 'count', 'distinct', 'aggregate')
+
+# url arguments of the api routes, filled from Seeder.sample()
+URL_ARGS = dict(cid='contest', pid='problem', tid='team', uid='user', sid='submission')
+
+# query strings of every GET route, unknown arguments are ignored by the api
+VARIANTS = [
+    '',
+    'cursor=',
+    'format=ndjson',
+    'status=Accepted',
+    'status=Accepted&problem_id=%(problem)s&team_id=%(team)s'
+]
+
+
+class QueryRecorder(monitoring.CommandListener):
+    """
+    Records the read commands of mongo clients created after it's registered,
+    so the audit explains the queries the api actually runs.
+    """
+
+    def __init__(self):
+        self.commands = None
+
+    def started(self, event):
+        if self.commands is not None and event.command_name in READ_COMMANDS:
+            self.commands.append((event.database_name, event.command_name, SON(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+recorder = QueryRecorder()
+
+
+def register():
+    """
+    Must be called before the app is created, pymongo adds listeners to
+    new clients only.
+    """
+    monitoring.register(recorder)
+
+
+def capture(app, sample):
+    """
+    Requests every GET route of the api (with the ids of Seeder.sample(), as
+    a team member and as the contest owner) with the pagination, ndjson and
+    filter variants, follows the next cursors and logs in.
+    Returns [(request name, database name, command name, command)].
+    """
+    from project.extensions import auth
+    from project.models.user import User
+    from project.modules.seeder import SEED_PASSWORD
+
+    client = app.test_client()
+    captured = []
+
+    def request(name, method, url, **kwargs):
+        recorder.commands = []
+        try:
+            return client.open(url, method=method, **kwargs)
+        except Exception as e:
+            app.logger.warning('%s %s failed: %s' % (method, url, e))
+        finally:
+            captured.extend((name,) + c for c in recorder.commands)
+            recorder.commands = None
+
+    username = User.objects.get(pk=sample['user']).username
+    request('POST user.login', 'POST', '/api/v1/user/login', content_type='application/json',
+            data=json.dumps(dict(login=username, password=SEED_PASSWORD)))
+
+    rules = [r for r in app.url_map.iter_rules() if r.endpoint.startswith('api_1.') and 'GET' in r.methods]
+    for role in ('user', 'owner'):
+        headers = {'Access-Token': auth.generate_token(sample[role])}
+        for rule in sorted(rules, key=lambda r: r.rule):
+            url = rule.rule
+            for arg in rule.arguments:
+                url = url.replace('<string:%s>' % arg, str(sample[URL_ARGS[arg]]))
+            for variant in VARIANTS:
+                args = ','.join(a.split('=')[0] for a in variant.split('&') if a)
+                name = 'GET %s%s (%s)' % (rule.endpoint[len('api_1.'):], ' ?' + args if args else '', role)
+                response = request(name, 'GET', url + '?' + variant % sample, headers=headers)
+                if variant == 'cursor=' and response is not None and response.mimetype == 'application/json':
+                    meta = json.loads(response.data).get('meta') or {}
+                    if meta.get('next'):
+                        request(name + ' next', 'GET', meta['next'], headers=headers)
+    return captured
+
+
+def judge_queries(sample):
+    """
+    [(name, queryset)] of the judge and the packer, which aren't reachable by
+    GET requests.
+    """
+    from project.models.submission import Submission
+    from project.modules.ijudge.types import JudgementStatusType
+
+    contest, team = sample['contest'], sample['team']
+    return [
+        ('submission.create (pending)', Submission.objects(contest=contest, team=team, status=JudgementStatusType.Pending)),
+        ('submission.pack_contest', Submission.objects(contest=contest, code_packed__ne=True, status__ne=JudgementStatusType.Pending))
+    ]
+
+
+def plan_stages(plan):
+    """
+    Stage names of a (winning) plan, from the root.
+    """
+    stages = [plan.get('stage')]
+    for child in [plan.get('inputStage')] + plan.get('inputStages', []):
+        if child:
+            stages += plan_stages(child)
+    return stages
+
+
+def query_of(command_name, command):
+    """
+    Returns (filter, [(field, direction)] of sort) of a read command.
+    """
+    if command_name == 'aggregate':
+        match = next((s['$match'] for s in command.get('pipeline', []) if '$match' in s), {})
+        return match, []
+    query = command.get('filter', command.get('query')) or {}
+    return query, list((command.get('sort') or {}).items())
+
+
+def shape(value):
+    """
+    The fields and operators of a query, without the values.
+    """
+    if isinstance(value, dict):
+        return dict((k, shape(v)) for k, v in value.items())
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        return [shape(v) for v in value]
+    return 1
+
+
+def explain(database, command):
+    """
+    Runs a captured command in explain mode, returns (winning plan, execution stats).
+    """
+    command = SON((k, v) for k, v in command.items() if not k.startswith('$') and k != 'lsid')
+    result = database.command('explain', command, verbosity='executionStats')
+    if 'stages' in result:
+        # aggregate, the first stage reads the collection
+        result = result['stages'][0].get('$cursor', {})
+    return result['queryPlanner']['winningPlan'], result.get('executionStats', {})
+
+
+def audit(name, database, command_name, command):
+    """
+    Explains a read command, returns a dict with the used stages, examined
+    and returned counts, problems and a suggested index if it has problems.
+    """
+    plan, stats = explain(database, command)
+    stages = plan_stages(plan)
+    returned = stats.get('nReturned', 0)
+    examined = stats.get('totalDocsExamined', 0)
+    query, ordering = query_of(command_name, command)
+
+    problems = []
+    if 'COLLSCAN' in stages:
+        problems.append('collection scan')
+    if 'SORT' in stages:
+        problems.append('in memory sort')
+    if examined > returned * MAX_EXAMINED_RATIO + SLACK:
+        problems.append('%d documents examined for %d' % (examined, returned))
+
+    return dict(
+        name=name,
+        collection=command[command_name],
+        stages=stages,
+        returned=returned,
+        examined=examined,
+        problems=problems,
+        suggestion=suggest_index(query, ordering) if problems else None
+    )
+
+
+def suggest_index(query, ordering=None):
+    """
+    A compound index for query, equality fields first, then the sort and
+    then range fields.
+    """
+    equality, ranges = [], []
+    for field, condition in _conditions(query):
+        if field == '_id':
+            continue
+        if isinstance(condition, dict) and set(condition) & RANGE_OPERATORS:
+            ranges.append(field)
+        elif field not in equality:
+            equality.append(field)
+
+    # a cursor query has its sort fields as both, e.g. $or of $lt and equality
+    equality = [f for f in equality if f not in ranges]
+    keys = [(f, 1) for f in sorted(equality)]
+    for field, direction in ordering or []:
+        if field not in equality:
+            keys.append((field, direction))
+    keys += [(f, 1) for f in ranges if f not in dict(keys)]
+    if not keys:
+        return None
+    return tuple(('-' if d < 0 else '') + f for f, d in keys)
+
+
+def _conditions(query):
+    for field, condition in query.items():
+        if field in ('$and', '$or'):
+            for sub in condition:
+                for item in _conditions(sub):
+                    yield item
+        else:
+            yield field, condition
+
+
+def run(app, sample):
+    """
+    Audits every distinct query (by collection, fields and sort) of the api
+    requests and the judge queries.
+    """
+    from project.models.user import User
+
+    reports, seen = [], set()
+    client = User._get_db().client
+    for name, database_name, command_name, command in capture(app, sample):
+        query, ordering = query_of(command_name, command)
+        key = json.dumps([command[command_name], command_name, shape(query), ordering], sort_keys=True)
+        if key in seen:
+            continue
+        seen.add(key)
+        reports.append(audit(name, client[database_name], command_name, command))
+
+    for name, queryset in judge_queries(sample):
+        collection = queryset._document._get_collection()
+        command = SON([('find', collection.name), ('filter', queryset._query)])
+        reports.append(audit(name, collection.database, 'find', command))
+    return reports
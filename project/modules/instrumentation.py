@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import os
+import time
+import random
+import cProfile
+from functools import wraps
+from pymongo import monitoring
+from redis.client import StrictRedis, BasePipeline
+from redis.exceptions import RedisError
+
+# flask imports
+from flask import request, g, has_request_context, abort
+
+# project imports
+from project.modules.fastjson import jsonify
+
+
+# upper bounds (ms) of the latency histogram buckets
+BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class CommandListener(monitoring.CommandListener):
+    """
+    Counts and times mongo commands of the current request, and logs the
+    commands slower than INSTRUMENTATION_SLOW_QUERY.
+    """
+
+    def __init__(self, instrumentation):
+        self.instrumentation = instrumentation
+        self.commands = {}
+
+    def started(self, event):
+        if has_request_context():
+            command = event.command
+            self.commands[event.request_id] = (
+                event.command_name,
+                command.get(event.command_name),
+                command.get('filter', command.get('query', command.get('q')))
+            )
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        command = self.commands.pop(event.request_id, None)
+        if command is None or not has_request_context():
+            return
+        elapsed = event.duration_micros / 1000.
+        self.instrumentation.add('mongo', elapsed)
+        if elapsed >= self.instrumentation.slow_query:
+            self.instrumentation.app.logger.warning(
+                'Slow mongo %s on %s (%.1f ms) in %s: %r' % (command[0], command[1], elapsed, request.endpoint, command[2])
+            )
+
+
+class Instrumentation(object):
+    """
+    Times requests, counts and times their mongo commands (pymongo command
+    monitoring) and redis calls, and aggregates them per endpoint in redis.
+    The stats are shown by GET /metrics/requests with a Metrics-Token header
+    (METRICS_TOKEN), and aren't saved without a token.
+    With INSTRUMENTATION_PROFILE_RATE, a sample of requests is profiled and
+    the profiles of the ones slower than INSTRUMENTATION_PROFILE_THRESHOLD
+    are saved into INSTRUMENTATION_PROFILE_DIR.
+
+    It's installed by application.configure_extensions before the other
+    extensions, mongo clients created before it aren't monitored.
+    """
+
+    prefix = 'instrumentation:'
+    installed = False
+
+    def __init__(self, redis_connection, app=None):
+        self.redis = redis_connection
+        self.app = app
+        if app:
+            self.install(app)
+
+
+    def install(self, app):
+        self.app = app
+        self.enabled = app.config['INSTRUMENTATION_ENABLED']
+        self.slow_query = app.config['INSTRUMENTATION_SLOW_QUERY']
+        self.profile_rate = app.config['INSTRUMENTATION_PROFILE_RATE']
+        self.profile_threshold = app.config['INSTRUMENTATION_PROFILE_THRESHOLD']
+        self.profile_dir = app.config['INSTRUMENTATION_PROFILE_DIR']
+        self.token = app.config['METRICS_TOKEN']
+
+        app.add_url_rule('/metrics/requests', 'metrics.requests', self.view, methods=['GET', 'DELETE'])
+        if not self.enabled:
+            return
+
+        if not Instrumentation.installed:
+            # both are process wide
+            monitoring.register(CommandListener(self))
+            StrictRedis.execute_command = self._timed('redis', StrictRedis.execute_command)
+            BasePipeline.execute = self._timed('redis', BasePipeline.execute)
+            Instrumentation.installed = True
+
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+
+    def _timed(self, name, f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            if not has_request_context():
+                return f(*args, **kwargs)
+            started = time.time()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                self.add(name, (time.time() - started) * 1000)
+        return wrapped
+
+
+    def add(self, name, elapsed):
+        stats = g.get('instrumentation')
+        if stats is not None:
+            stats[name + '_count'] += 1
+            stats[name + '_time'] += elapsed
+
+
+    def before_request(self):
+        g.instrumentation = dict(started=time.time(), mongo_count=0, mongo_time=0., redis_count=0, redis_time=0.)
+        if self.profile_rate and random.random() < self.profile_rate:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+
+    def after_request(self, response):
+        stats = g.get('instrumentation')
+        if stats is not None:
+            stats['status'] = response.status_code
+        return response
+
+
+    def teardown_request(self, exception=None):
+        """
+        Saves the stats, also of requests failed by an unhandled exception
+        (after_request isn't called for them).
+        """
+        stats = g.get('instrumentation')
+        if stats is None:
+            return
+        # the redis calls of saving the stats aren't counted
+        g.instrumentation = None
+        elapsed = (time.time() - stats['started']) * 1000
+
+        profiler = g.get('profiler')
+        if profiler:
+            profiler.disable()
+            if elapsed >= self.profile_threshold:
+                filename = '%s-%d.prof' % (request.endpoint, time.time() * 1000)
+                profiler.dump_stats(os.path.join(self.profile_dir, filename))
+
+        if not self.token:
+            return
+        bucket = next((b for b in BUCKETS if elapsed <= b), 'inf')
+        key = self.prefix + (request.endpoint or 'unmatched')
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hincrby(key, 'count', 1)
+            pipe.hincrbyfloat(key, 'time', elapsed)
+            pipe.hincrby(key, 'le_%s' % bucket, 1)
+            pipe.hincrby(key, 'mongo_count', stats['mongo_count'])
+            pipe.hincrbyfloat(key, 'mongo_time', stats['mongo_time'])
+            pipe.hincrby(key, 'redis_count', stats['redis_count'])
+            pipe.hincrbyfloat(key, 'redis_time', stats['redis_time'])
+            if exception is not None or stats.get('status', 500) >= 500:
+                pipe.hincrby(key, 'errors', 1)
+            pipe.sadd(self.prefix + 'endpoints', key)
+            pipe.execute()
+        except RedisError as e:
+            self.app.logger.warning('Instrumentation stats of %s are not saved: %s' % (request.endpoint, e))
+
+
+    def stats(self):
+        """
+        Returns {endpoint: stats} with average times (ms) and the bucket of
+        the p50, p95 and p99 latencies.
+        """
+        result = {}
+        for key in self.redis.smembers(self.prefix + 'endpoints'):
+            data = self.redis.hgetall(key)
+            count = int(data.get('count', 0))
+            if not count:
+                continue
+            buckets = [(b, int(data.get('le_%s' % b, 0))) for b in BUCKETS + ['inf']]
+            result[key[len(self.prefix):]] = dict(
+                count=count,
+                errors=int(data.get('errors', 0)),
+                avg_time=float(data['time']) / count,
+                p50=self._percentile(buckets, count, 0.5),
+                p95=self._percentile(buckets, count, 0.95),
+                p99=self._percentile(buckets, count, 0.99),
+                avg_mongo_count=float(data.get('mongo_count', 0)) / count,
+                avg_mongo_time=float(data.get('mongo_time', 0)) / count,
+                avg_redis_count=float(data.get('redis_count', 0)) / count,
+                avg_redis_time=float(data.get('redis_time', 0)) / count
+            )
+        return result
+
+
+    @staticmethod
+    def _percentile(buckets, count, p):
+        seen = 0
+        for bound, n in buckets:
+            seen += n
+            if seen >= count * p:
+                return bound
+        return 'inf'
+
+
+    def reset(self):
+        keys = self.redis.smembers(self.prefix + 'endpoints')
+        self.redis.delete(self.prefix + 'endpoints', *keys)
+
+
+    def view(self):
+        if not self.token:
+            return abort(404)
+        if request.headers.get('Metrics-Token') != self.token:
+            return abort(403, "Metrics token is invalid")
+        if request.method == 'DELETE':
+            self.reset()
+            return jsonify(), 200
+        return jsonify(self.stats()), 200
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+from collections import defaultdict
+from redis.exceptions import RedisError
+
+# flask imports
+from flask import request, abort
+
+
+SECONDS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+
+# name: (type, help, buckets)
+METRICS = {
+    'ijust_judge_queue_wait_seconds': ('histogram', 'Time from submitting to the start of judging', SECONDS),
+    'ijust_judge_seconds': ('histogram', 'Time of judging a submission', SECONDS),
+    'ijust_judge_compile_seconds': ('histogram', 'Time of compiling a submission', SECONDS),
+    'ijust_judge_testcase_seconds': ('histogram', 'Time of running one testcase', SECONDS),
+    'ijust_judge_verdicts_total': ('counter', 'Judged submissions by language and status', None),
+    'ijust_judge_failures_total': ('counter', 'Judgements failed by an error of the sandbox', None),
+    'ijust_scoreboard_update_seconds': ('histogram', 'Time of updating the result of a contest', SECONDS),
+    'ijust_judge_queue_length': ('gauge', 'Tasks waiting in the celery queue', None)
+}
+
+
+class Metrics(object):
+    """
+    Counters and histograms in redis, so the web app and the celery workers
+    add to the same values, exported in the prometheus text format by
+    GET /metrics (with METRICS_TOKEN as a bearer token or Metrics-Token header).
+    Writes never raise, a value is dropped if redis fails, so judging and
+    requests don't fail because of metrics.
+    """
+
+    prefix = 'metrics:'
+
+    def __init__(self, redis_connection, app=None):
+        self.redis = redis_connection
+        self.app = app
+        if app:
+            self.init_app(app)
+
+
+    def init_app(self, app):
+        self.app = app
+        self.token = app.config['METRICS_TOKEN']
+        self.queues = app.config['METRICS_CELERY_QUEUES']
+        app.add_url_rule('/metrics', 'metrics.export', self.view)
+
+
+    @staticmethod
+    def _labels(labels):
+        return ','.join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in sorted(labels.items()))
+
+
+    def inc(self, name, value=1, **labels):
+        try:
+            self.redis.hincrby(self.prefix + name, self._labels(labels), value)
+        except RedisError as e:
+            self.app.logger.warning('Metric %s is not saved: %s' % (name, e))
+
+
+    def observe(self, name, values, **labels):
+        """
+        Adds one value, or a list of values, to a histogram.
+        """
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        if not values:
+            return
+        buckets = METRICS[name][2]
+        key = self.prefix + name
+        labels = self._labels(labels)
+
+        pipe = self.redis.pipeline(transaction=False)
+        for value in values:
+            bucket = next((b for b in buckets if value <= b), '+Inf')
+            pipe.hincrby(key, '%s|%s' % (labels, bucket), 1)
+        pipe.hincrbyfloat(key, '%s|sum' % labels, sum(values))
+        pipe.hincrby(key, '%s|count' % labels, len(values))
+        try:
+            pipe.execute()
+        except RedisError as e:
+            self.app.logger.warning('Metric %s is not saved: %s' % (name, e))
+
+
+    def gauges(self):
+        """
+        Values read at export time.
+        """
+        lengths = self.redis.pipeline(transaction=False)
+        for queue in self.queues:
+            lengths.llen(queue)
+        return dict(ijust_judge_queue_length=[
+            (self._labels(dict(queue=queue)), length) for queue, length in zip(self.queues, lengths.execute())
+        ])
+
+
+    def render(self):
+        lines = []
+        gauges = self.gauges()
+        for name, (kind, help, buckets) in sorted(METRICS.items()):
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, kind))
+            if kind == 'gauge':
+                for labels, value in gauges.get(name, []):
+                    lines.append(self._line(name, labels, value))
+            elif kind == 'counter':
+                for labels, value in sorted(self.redis.hgetall(self.prefix + name).items()):
+                    lines.append(self._line(name, labels, value))
+            else:
+                lines += self._render_histogram(name, buckets)
+        return '\n'.join(lines) + '\n'
+
+
+    def _render_histogram(self, name, buckets):
+        series = defaultdict(dict)
+        for field, value in self.redis.hgetall(self.prefix + name).items():
+            labels, _, part = field.rpartition('|')
+            series[labels][part] = value
+
+        lines = []
+        for labels, data in sorted(series.items()):
+            cumulative = 0
+            for bound in [str(b) for b in buckets] + ['+Inf']:
+                cumulative += int(data.get(bound, 0))
+                le = 'le="%s"' % bound
+                lines.append(self._line(name + '_bucket', labels + ',' + le if labels else le, cumulative))
+            lines.append(self._line(name + '_sum', labels, data.get('sum', 0)))
+            lines.append(self._line(name + '_count', labels, data.get('count', 0)))
+        return lines
+
+
+    @staticmethod
+    def _line(name, labels, value):
+        return '%s{%s} %s' % (name, labels, value) if labels else '%s %s' % (name, value)
+
+
+    def view(self):
+        if not self.token:
+            return abort(404)
+        token = request.headers.get('Metrics-Token') or \
+                request.headers.get('Authorization', '').replace('Bearer ', '', 1)
+        if token != self.token:
+            return abort(403, "Metrics token is invalid")
+        return self.app.response_class(self.render(), mimetype='text/plain; version=0.0.4')
@@ -3,19 +3,33 @@ __author__ = 'AminHP'
 
 # python imports
 import json as pyjson
+import base64
+import hashlib
 from functools import wraps
 from cStringIO import StringIO as IO
+from bson import json_util
 
 # flask imports
-from flask import request, url_for, jsonify
+from flask import request, url_for, abort, Response, stream_with_context
 from flask.ext.mongoengine.pagination import Pagination
 
 # project imports
 from project import app
-from project.extensions import db
+from project.extensions import db, cache
+from project.modules.serializer import Serializer
+from project.modules.fastjson import jsonify, dumps
 
 
-def paginate(key, max_per_page, **pkwargs):
+NDJSON_BATCH_SIZE = 500
+
+
+def paginate(key, max_per_page, order=None, ndjson=False, **pkwargs):
+    """
+    Page number pagination, or cursor pagination when the endpoint has an
+    order (e.g. ('-starts_at',)) and the request has a cursor argument
+    (empty for the first page).
+    With ndjson, format=ndjson streams all items as newline delimited json.
+    """
 
     def decorator(f):
         @wraps(f)
@@ -31,6 +45,16 @@ def paginate(key, max_per_page, **pkwargs):
             if not isinstance(query, db.QuerySet):
                 return f(*args, **kwargs)
 
+            if ndjson and request.args.get('format') == 'ndjson':
+                return ndjson_stream(query, result_func)
+
+            if order and 'cursor' in request.args:
+                return cursor_paginate(key, query, result_func, per_page, order, kwargs)
+
+            # serializers work on raw documents of the page
+            if isinstance(result_func, Serializer):
+                query = result_func.query(query)
+
             pagination_obj = Pagination(query, page, per_page)
             meta = {
                 'page': pagination_obj.page,
@@ -77,11 +101,154 @@ def paginate(key, max_per_page, **pkwargs):
                 **kwargs
             )
 
+            if isinstance(result_func, Serializer):
+                items = result_func.dump_many(pagination_obj.items)
+            else:
+                items = [result_func(item) for item in pagination_obj.items]
+
             return jsonify({
-                str(key): [result_func(item) for item in pagination_obj.items],
+                str(key): items,
                 'meta': meta
             })
 
         return wrapped
 
     return decorator
+
+
+def _order_fields(query, order):
+    """
+    Returns [(field name, db field name, direction)] of order with the id as tie breaker.
+    """
+    fields = []
+    for name in order:
+        direction = -1 if name.startswith('-') else 1
+        name = name.lstrip('-+')
+        fields.append((name, query._document._fields[name].db_field, direction))
+    fields.append(('id', '_id', fields[-1][2] if fields else 1))
+    return fields
+
+
+def _encode_cursor(backward, values):
+    data = json_util.dumps(dict(b=backward, v=values))
+    return base64.urlsafe_b64encode(data).rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        data = json_util.loads(base64.urlsafe_b64decode(str(cursor) + '=' * (-len(cursor) % 4)))
+        return bool(data['b']), list(data['v'])
+    except (ValueError, TypeError, KeyError):
+        return abort(400, "Invalid cursor")
+
+
+def _keyset_query(fields, values, backward):
+    """
+    Documents after values in the order of fields (before them if backward).
+    """
+    ors = []
+    for i, (name, db_field, direction) in enumerate(fields):
+        condition = dict((fields[j][1], values[j]) for j in range(i))
+        ascending = (direction > 0) != backward
+        condition[db_field] = {'$gt' if ascending else '$lt': values[i]}
+        ors.append(condition)
+    return {'$and': [{'$or': ors}]}
+
+
+def _approximate_total(query):
+    """
+    Total count of a query, cached for PAGINATION_TOTAL_CACHE_TIMEOUT seconds.
+    """
+    spec = json_util.dumps(query._query, sort_keys=True)
+    cache_key = 'pagination:total:%s:%s' % (query._document._get_collection_name(), hashlib.sha1(spec).hexdigest())
+    total = cache.get(cache_key)
+    if total is None:
+        total = query.count()
+        cache.set(cache_key, total, timeout=app.config['PAGINATION_TOTAL_CACHE_TIMEOUT'])
+    return total
+
+
+def cursor_paginate(key, query, result_func, per_page, order, kwargs):
+    fields = _order_fields(query, order)
+    meta = {'per_page': per_page}
+    if request.args.get('with_total', 0, type=int):
+        meta['total'] = _approximate_total(query)
+
+    cursor = request.args.get('cursor')
+    backward = False
+    if cursor:
+        backward, values = _decode_cursor(cursor)
+        if len(values) != len(fields):
+            return abort(400, "Invalid cursor")
+        query = query.filter(__raw__=_keyset_query(fields, values, backward))
+
+    sort_order = [('-' if (direction > 0) == backward else '') + name for name, _, direction in fields]
+    query = query.order_by(*sort_order)
+    if isinstance(result_func, Serializer):
+        query = result_func.query(query).only(*[name for name, _, _ in fields])
+
+    items = list(query.limit(per_page + 1))
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if backward:
+        items.reverse()
+
+    def values_of(item):
+        if isinstance(item, dict):
+            return [item.get(db_field) for _, db_field, _ in fields]
+        return [item[name] for name, _, _ in fields]
+
+    next_cursor = prev_cursor = None
+    if items and (has_more or backward):
+        next_cursor = _encode_cursor(False, values_of(items[-1]))
+    if items and (has_more if backward else cursor):
+        prev_cursor = _encode_cursor(True, values_of(items[0]))
+
+    meta['next_cursor'] = next_cursor
+    meta['prev_cursor'] = prev_cursor
+    for name, value in (('next', next_cursor), ('prev', prev_cursor)):
+        meta[name] = url_for(
+            request.endpoint,
+            cursor=value,
+            per_page=per_page,
+            _external=True,
+            **kwargs
+        ) if value else None
+
+    if isinstance(result_func, Serializer):
+        items = result_func.dump_many(items)
+    else:
+        items = [result_func(item) for item in items]
+
+    return jsonify({
+        str(key): items,
+        'meta': meta
+    })
+
+
+def ndjson_stream(query, result_func):
+    """
+    Streams every item of query, serializers load references once per batch.
+    """
+    if isinstance(result_func, Serializer):
+        query = result_func.query(query)
+
+    def generate():
+        batch = []
+        for item in query.batch_size(NDJSON_BATCH_SIZE):
+            batch.append(item)
+            if len(batch) == NDJSON_BATCH_SIZE:
+                yield _ndjson_lines(batch, result_func)
+                batch = []
+        if batch:
+            yield _ndjson_lines(batch, result_func)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def _ndjson_lines(items, result_func):
+    if isinstance(result_func, Serializer):
+        items = result_func.dump_many(items)
+    else:
+        items = [result_func(item) for item in items]
+    return ''.join(dumps(item) + '\n' for item in items)
@@ -2,11 +2,12 @@
 __author__ = 'AminHP'
 
 #python imports
+import time
 import requests
+from requests.adapters import HTTPAdapter
 
 
 class ReCaptcha(object):
-    url = "https://www.google.com/recaptcha/api/siteverify"
 
     def __init__(self, app=None):
         self.app = app
@@ -17,8 +18,22 @@ class ReCaptcha(object):
         self.enabled = app.config['RECAPTCHA_ENABLED']
         self.site_key = app.config['RECAPTCHA_SITE_KEY']
         self.secret_key = app.config['RECAPTCHA_SECRET_KEY']
+        self.url = app.config['RECAPTCHA_VERIFY_URL']
+        self.timeout = app.config['RECAPTCHA_TIMEOUT']
+        self.fail_open = app.config['RECAPTCHA_FAIL_OPEN']
+        self.breaker_threshold = app.config['RECAPTCHA_BREAKER_THRESHOLD']
+        self.breaker_reset = app.config['RECAPTCHA_BREAKER_RESET']
+        self.cache_timeout = app.config['RECAPTCHA_CACHE_TIMEOUT']
         self.app = app
 
+        # one keep-alive connection pool per process
+        self.session = requests.Session()
+        self.session.mount(self.url, HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+
+        self.failures = 0
+        self.opened_at = None
+        self.verdicts = {}
+
 
     def get_site_key(self):
         return self.site_key
@@ -28,10 +43,87 @@ class ReCaptcha(object):
         if not self.enabled:
             return True
 
+        verdict = self._cached_verdict(response)
+        if verdict is not None:
+            return verdict
+
+        if self._is_open():
+            return self.fail_open
+
         data = {
             "secret": self.secret_key,
             "response": response
         }
 
-        r = requests.get(self.url, params=data)
-        return r.json()['success'] and r.status_code == 200
+        try:
+            r = self.session.post(self.url, data=data, timeout=self.timeout)
+            r.raise_for_status()
+            verdict = bool(r.json()['success'])
+        except (requests.RequestException, ValueError, KeyError):
+            self._failed()
+            return self.fail_open
+
+        self._succeeded()
+        # captchas are used once, a passed one is remembered as failed for replays
+        self._cache_verdict(response, False)
+        return verdict
+
+
+    def _is_open(self):
+        if self.opened_at is None:
+            return False
+        if time.time() - self.opened_at >= self.breaker_reset:
+            # half open, let the next request try google again
+            self.opened_at = None
+            self.failures = self.breaker_threshold - 1
+            return False
+        return True
+
+
+    def _failed(self):
+        self.failures += 1
+        if self.failures >= self.breaker_threshold:
+            self.opened_at = time.time()
+
+
+    def _succeeded(self):
+        self.failures = 0
+        self.opened_at = None
+
+
+    def _cached_verdict(self, response):
+        item = self.verdicts.get(response)
+        if item is None:
+            return None
+        verdict, expires_at = item
+        if expires_at < time.time():
+            del self.verdicts[response]
+            return None
+        return verdict
+
+
+    def _cache_verdict(self, response, verdict):
+        now = time.time()
+        if len(self.verdicts) >= 1000:
+            self.verdicts = dict((k, v) for k, v in self.verdicts.iteritems() if v[1] >= now)
+            if len(self.verdicts) >= 1000:
+                self.verdicts = {}
+        self.verdicts[response] = (verdict, now + self.cache_timeout)
+
+
+def create_stub_app():
+    """
+    A local siteverify server for offline testing, accepts every captcha except 'wrong'.
+    """
+    from flask import Flask, request, jsonify
+
+    stub = Flask('recaptcha_stub')
+
+    @stub.route('/recaptcha/api/siteverify', methods=['GET', 'POST'])
+    def siteverify():
+        response = request.values.get('response')
+        if not response or response == 'wrong':
+            return jsonify(success=False, **{'error-codes': ['invalid-input-response']})
+        return jsonify(success=True, hostname='localhost')
+
+    return stub
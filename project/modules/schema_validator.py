@@ -7,7 +7,6 @@ import imp
 import pkgutil
 from functools import wraps
 from good import Schema, Invalid
-import collections
 
 # flask imports
 from flask import request, abort
@@ -48,46 +47,51 @@ class Validator(object):
 
 
     def validate_schema(self, schema_name, api=False):
+        """
+        The schema is looked up once when the view is decorated, an unknown
+        schema fails on importing the controller.
+        """
         def wrapper(f):
+            api_dir = ''
+            if api:
+                api_dir = "%s." % f.__module__.split('.')[2]
+            check = self.checker(self.schemas[api_dir + schema_name])
+
             @wraps(f)
             def decorated(*args, **kwargs):
-                api_dir = ''
-                if api:
-                    api_dir = "%s." % f.__module__.split('.')[2]
-                schema = self.schemas[api_dir + schema_name]
-                #########################
-                json = request.json or {}
-                try:
-                    schema(json)
-                except Invalid as ee:
-
-                    def update(d, u):
-                        for k, v in u.iteritems():
-                            if isinstance(v, collections.Mapping):
-                                r = update(d.get(k, {}), v)
-                                d[k] = r
-                            else:
-                                d[k] = u[k]
-                        return d
-
-                    def get_errors():
-                        errors = {}
-                        for e in ee:
-                            main = each = {}
-                            for p in e.path:
-                                prev = each
-                                each[p] = {}
-                                each = each[p]
-                            prev[prev.keys()[0]] = e.message
-                            update(errors, main)
-                        return errors
-
-                    return abort(400, get_errors())
-
+                errors = check(request.json or {})
+                if errors is not None:
+                    return abort(400, errors)
                 return f(*args, **kwargs)
             return decorated
         return wrapper
 
 
+    @staticmethod
+    def checker(schema):
+        """
+        A function of json which returns None if it's valid, else the errors
+        as {field: {index: message}} (or one message if json itself is invalid).
+        """
+        def check(json):
+            try:
+                schema(json)
+            except Invalid as ee:
+                errors = {}
+                for e in ee:
+                    if not e.path:
+                        return e.message
+                    node = errors
+                    for p in e.path[:-1]:
+                        child = node.get(p)
+                        if not isinstance(child, dict):
+                            child = node[p] = {}
+                        node = child
+                    node[e.path[-1]] = e.message
+                return errors
+            return None
+        return check
+
+
     def api_validate_schema(self, schema_name):
         return self.validate_schema(schema_name, True)
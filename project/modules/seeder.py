@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import random
+
+# project imports
+from project.modules.datetime import utcnowts
+from project.modules.ijudge.types import JudgementStatusType, ProgrammingLanguageType
+
+
+SEED_PASSWORD = 'seed123'
+
+# ratios of one scale unit
+USERS = 2000
+TEAMS = 600
+CONTESTS = 50
+SUBMISSIONS = 20000
+
+STATUS_WEIGHTS = [
+    (JudgementStatusType.Pending, 2),
+    (JudgementStatusType.Accepted, 35),
+    (JudgementStatusType.CompileError, 10),
+    (JudgementStatusType.WrongAnswer, 35),
+    (JudgementStatusType.TimeExceeded, 10),
+    (JudgementStatusType.SpaceExceeded, 3),
+    (JudgementStatusType.RuntimeError, 5)
+]
+
+
+class Seeder(object):
+    """
+    Fills an empty database with users, teams, contests, problems and
+    submissions shaped like a real deployment, with raw bulk inserts.
+    Users and teams are named user<n> and team<n>, all passwords are
+    SEED_PASSWORD.
+    """
+
+    def __init__(self, scale=1, seed=None):
+        self.scale = scale
+        self.random = random.Random(seed)
+        self.user_ids = []
+        self.team_ids = []
+        self.contest_ids = []
+        self.problem_ids = []
+        self.teams = {}
+        self.contests = {}
+
+    @staticmethod
+    def models():
+        from project.models.user import User
+        from project.models.team import Team
+        from project.models.contest import Contest, Problem, Result
+        from project.models.submission import Submission
+        from project.models.membership import Membership
+        return [User, Team, Problem, Result, Contest, Submission, Membership]
+
+    @classmethod
+    def is_empty(cls):
+        return all(model.objects.count() == 0 for model in cls.models())
+
+    @classmethod
+    def clear(cls):
+        for model in cls.models():
+            model.drop_collection()
+
+    def run(self):
+        for model in self.models():
+            model.ensure_indexes()
+        self.seed_users()
+        self.seed_teams()
+        self.seed_contests()
+        self.seed_submissions()
+
+        from project.models.membership import Membership
+        Membership.rebuild()
+        return self
+
+    def _insert(self, model, docs):
+        ids = []
+        for i in range(0, len(docs), 1000):
+            ids += model._get_collection().insert_many([d.to_mongo() for d in docs[i:i + 1000]]).inserted_ids
+        return ids
+
+    def seed_users(self):
+        from project.extensions import hasher
+        from project.models.user import User
+        password = hasher.hash(SEED_PASSWORD)
+        users = [
+            User(username='user%d' % i, email='user%d@example.com' % i, password=password, firstname='User %d' % i)
+            for i in xrange(USERS * self.scale)
+        ]
+        self.user_ids = self._insert(User, users)
+
+    def seed_teams(self):
+        from project.models.team import Team
+        teams = []
+        for i in xrange(TEAMS * self.scale):
+            owner = self.user_ids[i]
+            members = [m for m in self.random.sample(self.user_ids, self.random.randint(0, 2)) if m != owner]
+            teams.append(Team(name='team%d' % i, owner=owner, members=members))
+        self.team_ids = self._insert(Team, teams)
+        # plain values, reference fields of the documents would be dereferenced
+        self.teams = dict((tid, dict(owner=t.to_mongo()['owner'], members=t.to_mongo().get('members', [])))
+                          for tid, t in zip(self.team_ids, teams))
+
+    def seed_contests(self):
+        from project.models.contest import Contest, Problem, Result
+        now = utcnowts()
+        contests = []
+        for i in xrange(CONTESTS * self.scale):
+            problems = [
+                Problem(title='Problem %d-%d' % (i, p), time_limit=1, space_limit=64)
+                for p in xrange(self.random.randint(5, 12))
+            ]
+            problem_ids = self._insert(Problem, problems)
+            self.problem_ids += problem_ids
+
+            # the first contest is running, most others have ended and
+            # about a quarter are upcoming
+            starts_at = now - 60 if i == 0 else now + self.random.randint(-90, 30) * 86400
+            teams = self.random.sample(self.team_ids, min(len(self.team_ids), self.random.randint(10, 70)))
+            pending = self.random.randint(0, 10)
+            contests.append(dict(
+                name='Contest %d' % i,
+                owner=self.random.choice(self.user_ids),
+                admins=self.random.sample(self.user_ids, self.random.randint(0, 2)),
+                created_at=starts_at - 7 * 86400,
+                starts_at=starts_at,
+                ends_at=starts_at + self.random.choice([2, 3, 5]) * 3600,
+                pending_teams=teams[:pending],
+                accepted_teams=teams[pending:],
+                problems=problem_ids
+            ))
+        results = self._insert(Result, [Result() for c in contests])
+        for c, rid in zip(contests, results):
+            c['result'] = rid
+        self.contest_ids = self._insert(Contest, [Contest(**c) for c in contests])
+        self.contests = dict(zip(self.contest_ids, contests))
+
+    def seed_submissions(self):
+        from project.models.submission import Submission
+        statuses = [s for s, weight in STATUS_WEIGHTS for i in range(weight)]
+        languages = list(ProgrammingLanguageType)
+        submissions = []
+        for i in xrange(SUBMISSIONS * self.scale):
+            cid = self.random.choice(self.contest_ids)
+            contest = self.contests[cid]
+            tid = self.random.choice(contest['accepted_teams'])
+            team = self.teams[tid]
+            submissions.append(Submission(
+                filename='main.cpp',
+                prog_lang=self.random.choice(languages).value,
+                submitted_at=self.random.randint(contest['starts_at'], contest['ends_at']),
+                contest=cid,
+                problem=self.random.choice(contest['problems']),
+                team=tid,
+                user=self.random.choice([team['owner']] + team['members']),
+                status=self.random.choice(statuses).value,
+                code_packed=False
+            ))
+        self._insert(Submission, submissions)
+
+    def sample(self):
+        """
+        Ids of the latest started contest with one of its teams, problems,
+        submissions and users.
+        """
+        from project.models.submission import Submission
+        now = utcnowts()
+        cid = max(self.contest_ids, key=lambda c: self.contests[c]['starts_at'] if self.contests[c]['starts_at'] <= now else 0)
+        contest = self.contests[cid]
+        tid = contest['accepted_teams'][0]
+        return dict(
+            contest=cid,
+            team=tid,
+            pending_team=(contest['pending_teams'] or [tid])[0],
+            problem=contest['problems'][0],
+            user=self.teams[tid]['owner'],
+            submission=Submission._get_collection().find_one({'contest': cid}, {'_id': 1})['_id'],
+            owner=contest['owner'],
+            admin=(contest['admins'] or [contest['owner']])[0]
+        )
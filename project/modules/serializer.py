@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+
+class Ref(object):
+    """
+    A reference field serialized by another serializer.
+    """
+
+    def __init__(self, serializer, many=False):
+        self.serializer = serializer
+        self.many = many
+
+
+class Serializer(object):
+    """
+    Serializes raw pymongo documents without building MongoEngine objects.
+    Only `fields` and the keys of `refs` are loaded, and each reference field
+    is loaded once per response with one $in query, so serializing a list costs
+    one query per reference field instead of one query per document.
+    """
+
+    model = None
+    fields = ()
+    refs = {}
+
+    def projection(self):
+        return dict((f, 1) for f in set(self.fields) | set(self.refs))
+
+    def query(self, queryset):
+        """
+        Raw documents of a queryset, with the projection of this serializer.
+        """
+        return queryset.only('id', *(set(self.fields) | set(self.refs))).as_pymongo()
+
+    def dump(self, doc):
+        raise NotImplementedError()
+
+    def dump_many(self, docs):
+        docs = list(docs)
+        self.resolve(docs)
+        return [self.dump(doc) for doc in docs]
+
+    def dump_query(self, queryset):
+        return self.dump_many(self.query(queryset))
+
+    def dump_ids(self, ids):
+        """
+        Returns json of the given ids in the same order, missing documents are left out.
+        """
+        loaded = self.load(ids)
+        return [loaded[i] for i in ids if i in loaded]
+
+    def load(self, ids):
+        """
+        Returns {id: json} of the given ids, missing documents are left out.
+        """
+        ids = list(set(ids))
+        if not ids:
+            return {}
+        docs = list(self.model._get_collection().find({'_id': {'$in': ids}}, self.projection()))
+        return dict((doc['_id'], json) for doc, json in zip(docs, self.dump_many(docs)))
+
+    def resolve(self, docs):
+        """
+        Replaces reference ids of docs with the json of the referenced documents.
+        """
+        for field, ref in self.refs.items():
+            ids = []
+            for doc in docs:
+                value = doc.get(field)
+                if ref.many:
+                    ids += value or []
+                elif value is not None:
+                    ids.append(value)
+
+            loaded = ref.serializer.load(ids)
+            for doc in docs:
+                value = doc.get(field)
+                if ref.many:
+                    doc[field] = [loaded[v] for v in value or [] if v in loaded]
+                else:
+                    doc[field] = loaded.get(value)
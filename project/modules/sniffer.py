@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import magic
+
+
+SNIFF_SIZE = 1024
+
+_TEXT_CHARS = bytearray([7, 8, 9, 10, 11, 12, 13, 27]) + bytearray(range(0x20, 0x7f)) + bytearray(range(0x80, 0x100))
+
+
+def is_pdf(data):
+    return data.startswith('%PDF-')
+
+
+def is_zip(data):
+    return data.startswith('PK\003\004') or data.startswith('PK\005\006')
+
+
+def is_text(data):
+    if not data or '\0' in data:
+        return False
+    return not data.translate(None, _TEXT_CHARS)
+
+
+def sniff(data):
+    """
+    Cheap mime detection for the types we accept, None if unknown.
+    """
+    if is_pdf(data):
+        return 'application/pdf'
+    if is_zip(data):
+        return 'application/zip'
+    if is_text(data):
+        return 'text/plain'
+    return None
+
+
+def sniff_file(file_obj, fallback=True):
+    """
+    Sniffs the head of an uploaded file, libmagic is used only for unknown types.
+    """
+    data = file_obj.read(SNIFF_SIZE)
+    file_obj.seek(0)
+
+    mime = sniff(data)
+    if mime is None and fallback:
+        mime = magic.from_buffer(data, mime=True)
+    return mime
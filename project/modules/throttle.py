@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import time
+
+
+class Throttle(object):
+    """
+    Sliding window rate limiter shared by all processes.
+    The window is approximated with two fixed window counters, so an allowed
+    hit is one redis round trip (incr, expire and get in a pipeline).
+    """
+
+    stats_key = 'throttle:stats'
+
+    def __init__(self, redis_connection, app=None):
+        self.redis = redis_connection
+        self.app = app
+        if app:
+            self.init_app(app)
+
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config['THROTTLE_ENABLED']
+        self.rules = app.config['THROTTLE_RULES']
+
+
+    def hit(self, rule, key):
+        """
+        Counts a hit of key, returns seconds to wait if the rule limit is
+        exceeded, otherwise 0.
+        """
+        if not self.enabled:
+            return 0
+
+        limit, window = self.rules[rule]
+        now = time.time()
+        current = int(now // window)
+        elapsed = now - current * window
+        prefix = 'throttle:%s:%s:' % (rule, key)
+
+        pipe = self.redis.pipeline()
+        pipe.incr(prefix + str(current))
+        pipe.expire(prefix + str(current), window * 2)
+        pipe.get(prefix + str(current - 1))
+        pipe.hincrby(self.stats_key, rule + ':hits', 1)
+        count, _, previous, _ = pipe.execute()
+
+        weight = 1 - elapsed / window
+        estimated = count + int(previous or 0) * weight
+        if estimated <= limit:
+            return 0
+
+        self.redis.hincrby(self.stats_key, rule + ':limited', 1)
+        return int(window - elapsed) + 1
+
+
+    def stats(self):
+        """
+        Returns {rule: {'hits': n, 'limited': n}} since the last reset.
+        """
+        result = dict((rule, {'hits': 0, 'limited': 0}) for rule in self.rules)
+        for field, value in self.redis.hgetall(self.stats_key).items():
+            rule, kind = field.rsplit(':', 1)
+            result.setdefault(rule, {'hits': 0, 'limited': 0})[kind] = int(value)
+        return result
+
+
+    def reset_stats(self):
+        self.redis.delete(self.stats_key)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import time
+import math
+import random
+import cPickle as pickle
+from uuid import uuid4
+from functools import wraps
+from collections import OrderedDict
+
+
+class TieredCache(object):
+    """
+    Two tier cache, a bounded LRU of each process in front of redis.
+
+    Values are stored in redis with the time it took to build them. A value
+    is rebuilt a little before it expires, with a probability growing as the
+    expiry gets closer and with the build time (probabilistic early expiry),
+    so a hot key is usually rebuilt by one request before it's gone.
+    Only the process which takes the redis lock of a key rebuilds it, the
+    others serve the stale value for up to TIERED_CACHE_STALE_TIMEOUT seconds
+    or, if there's no value at all, wait TIERED_CACHE_WAIT_TIMEOUT seconds for
+    the lock holder and then build it themselves.
+
+    The LRU keeps values for TIERED_CACHE_LOCAL_TIMEOUT seconds, so delete
+    reaches other processes after at most that long.
+    """
+
+    prefix = 'tiered:'
+    poll_interval = 0.02
+
+    def __init__(self, redis_connection, app=None):
+        self.redis = redis_connection
+        self.app = app
+        self.local = OrderedDict()
+        if app:
+            self.init_app(app)
+
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config['TIERED_CACHE_ENABLED']
+        self.local_size = app.config['TIERED_CACHE_LOCAL_SIZE']
+        self.local_timeout = app.config['TIERED_CACHE_LOCAL_TIMEOUT']
+        self.stale_timeout = app.config['TIERED_CACHE_STALE_TIMEOUT']
+        self.lock_timeout = app.config['TIERED_CACHE_LOCK_TIMEOUT']
+        self.wait_timeout = app.config['TIERED_CACHE_WAIT_TIMEOUT']
+        self.beta = app.config['TIERED_CACHE_BETA']
+        self.local.clear()
+
+
+    def cached(self, key, timeout):
+        """
+        Decorator, key(*args, **kwargs) returns the cache key of a call and
+        timeout is seconds or a function returning seconds.
+        Results which are None aren't cached.
+        """
+        def decorator(f):
+            @wraps(f)
+            def wrapped(*args, **kwargs):
+                if not self.enabled:
+                    return f(*args, **kwargs)
+                t = timeout() if callable(timeout) else timeout
+                return self.get(key(*args, **kwargs), lambda: f(*args, **kwargs), t)
+            wrapped.uncached = f
+            return wrapped
+        return decorator
+
+
+    def get(self, key, build, timeout):
+        now = time.time()
+        entry = self._local_get(key, now)
+        if entry is not None and not self._expired(entry, now):
+            return entry[0]
+
+        raw = self.redis.get(self.prefix + key)
+        entry = pickle.loads(raw) if raw else None
+        if entry is not None:
+            if not self._expired(entry, now):
+                self._local_set(key, entry, now)
+                return entry[0]
+            # stale while revalidate, only the lock holder rebuilds
+            token = self._lock(key)
+            if not token:
+                return entry[0]
+            return self._build(key, build, timeout, token)
+
+        token = self._lock(key)
+        if not token:
+            entry = self._wait(key)
+            if entry is not None:
+                self._local_set(key, entry, time.time())
+                return entry[0]
+        return self._build(key, build, timeout, token)
+
+
+    def delete(self, key):
+        self.local.pop(key, None)
+        self.redis.delete(self.prefix + key)
+
+
+    def _expired(self, entry, now):
+        """
+        XFetch, true after the expiry or randomly a little before it.
+        """
+        value, expires_at, delta = entry
+        return now - delta * self.beta * math.log(1 - random.random()) >= expires_at
+
+
+    def _build(self, key, build, timeout, token):
+        try:
+            started = time.time()
+            value = build()
+            delta = time.time() - started
+            if value is not None:
+                entry = (value, started + timeout, delta)
+                self.redis.setex(
+                    self.prefix + key,
+                    pickle.dumps(entry, pickle.HIGHEST_PROTOCOL),
+                    int(timeout + self.stale_timeout)
+                )
+                self._local_set(key, entry, started)
+            return value
+        finally:
+            if token:
+                self._unlock(key, token)
+
+
+    def _lock(self, key):
+        token = uuid4().hex
+        if self.redis.set(self.prefix + 'lock:' + key, token, nx=True, ex=self.lock_timeout):
+            return token
+        return None
+
+
+    def _unlock(self, key, token):
+        lock_key = self.prefix + 'lock:' + key
+        if self.redis.get(lock_key) == token:
+            self.redis.delete(lock_key)
+
+
+    def _wait(self, key):
+        """
+        Waits for the lock holder to store the value, returns None if it
+        takes more than the wait timeout (a short one, the process is busy
+        while it waits).
+        """
+        deadline = time.time() + self.wait_timeout
+        while time.time() < deadline:
+            time.sleep(self.poll_interval)
+            raw = self.redis.get(self.prefix + key)
+            if raw:
+                return pickle.loads(raw)
+            if not self.redis.exists(self.prefix + 'lock:' + key):
+                return None
+        return None
+
+
+    def _local_get(self, key, now):
+        item = self.local.pop(key, None)
+        if item is None:
+            return None
+        entry, local_expires_at = item
+        if local_expires_at < now:
+            return None
+        self.local[key] = item
+        return entry
+
+
+    def _local_set(self, key, entry, now):
+        self.local.pop(key, None)
+        self.local[key] = (entry, now + self.local_timeout)
+        while len(self.local) > self.local_size:
+            self.local.popitem(last=False)
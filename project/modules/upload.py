@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import os
+import tempfile
+from io import BytesIO
+
+# flask imports
+from flask import Request, request, abort, current_app
+
+
+class UploadRequest(Request):
+    spool_size = 500 * 1024
+
+    @property
+    def max_content_length(self):
+        config = current_app.config
+        return config['UPLOAD_LIMITS'].get(self.endpoint, config['MAX_CONTENT_LENGTH'])
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= self.spool_size:
+            return BytesIO()
+        # big files are spooled next to media files, so they can be linked instead of copied
+        return tempfile.NamedTemporaryFile('wb+', dir=current_app.config['UPLOAD_DIR'])
+
+
+class Upload(object):
+    def __init__(self, app=None):
+        self.app = app
+        if app:
+            self.init_app(app)
+
+
+    def init_app(self, app):
+        self.app = app
+        app.request_class = UploadRequest
+        app.before_request(self.check_content_length)
+
+
+    def check_content_length(self):
+        limit = request.max_content_length
+        if limit is not None and request.content_length > limit:
+            return abort(413)
+
+
+    @staticmethod
+    def save(file_storage, dest):
+        """
+        Moves an uploaded file to dest, spooled files are hard linked.
+        """
+        stream = file_storage.stream
+        if os.path.exists(dest):
+            os.remove(dest)
+        if isinstance(getattr(stream, 'name', None), basestring):
+            stream.flush()
+            try:
+                os.link(stream.name, dest)
+                return
+            except OSError:
+                pass
+        file_storage.save(dest)
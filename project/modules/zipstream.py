@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import os
+import time
+import zlib
+import hashlib
+import struct
+import zipfile
+
+
+class ZipStream(object):
+    """
+    Writes a zip archive as a sequence of byte chunks, so it can be sent to a
+    client or a non-seekable file without building it in memory.
+    Sizes and crc of every entry are written after its data (data descriptor).
+    Archives may be larger than 4GB (ZIP64 offsets and end records), single
+    entries may not.
+    """
+
+    chunk_size = 64 * 1024
+    zip64_limit = 0xffffffff
+
+    def __init__(self, compression=zipfile.ZIP_DEFLATED):
+        self.compression = compression
+        self.offset = 0
+        self.entries = []
+
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+
+    @staticmethod
+    def _dos_datetime(timestamp):
+        t = time.localtime(timestamp)
+        dosdate = (max(t[0], 1980) - 1980) << 9 | t[1] << 5 | t[2]
+        dostime = t[3] << 11 | t[4] << 5 | (t[5] // 2)
+        return dostime, dosdate
+
+    def add(self, arcname, fileobj, mtime=None):
+        """
+        Yields the chunks of a new entry read from fileobj.
+        The sha256 of the content is kept in self.entries once it's done.
+        """
+        if isinstance(arcname, unicode):
+            arcname = arcname.encode('utf-8')
+        flags = 0x08 | 0x800
+        dostime, dosdate = self._dos_datetime(mtime or time.time())
+        header_offset = self.offset
+
+        yield self._emit(struct.pack(
+            '<4sHHHHHLLLHH', 'PK\003\004', 20, flags, self.compression,
+            dostime, dosdate, 0, 0, 0, len(arcname), 0
+        ) + arcname)
+
+        compressor = None
+        if self.compression == zipfile.ZIP_DEFLATED:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+
+        sha = hashlib.sha256()
+        crc = size = compressed_size = 0
+        while True:
+            data = fileobj.read(self.chunk_size)
+            if not data:
+                break
+            sha.update(data)
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                compressed_size += len(data)
+                yield self._emit(data)
+
+        if compressor:
+            data = compressor.flush()
+            compressed_size += len(data)
+            yield self._emit(data)
+
+        if size > self.zip64_limit or compressed_size > self.zip64_limit:
+            raise zipfile.LargeZipFile("Zip entry is larger than 4GB: %s" % arcname)
+
+        crc &= 0xffffffff
+        yield self._emit(struct.pack('<4sLLL', 'PK\007\010', crc, compressed_size, size))
+
+        self.entries.append(dict(
+            arcname=arcname,
+            flags=flags,
+            dostime=dostime,
+            dosdate=dosdate,
+            crc=crc,
+            compressed_size=compressed_size,
+            size=size,
+            sha256=sha.hexdigest(),
+            offset=header_offset
+        ))
+
+    def add_path(self, arcname, path):
+        with open(path, 'rb') as f:
+            for chunk in self.add(arcname, f, mtime=os.stat(path).st_mtime):
+                yield chunk
+
+    def finish(self):
+        """
+        Yields the central directory, must be called after the last entry.
+        """
+        cd_offset = self.offset
+        for e in self.entries:
+            offset, extra, version = e['offset'], '', 20
+            if offset > self.zip64_limit:
+                # zip64 extra field with the real offset
+                offset, extra, version = 0xffffffff, struct.pack('<HHQ', 1, 8, e['offset']), 45
+            yield self._emit(struct.pack(
+                '<4sHHHHHHLLLHHHHHLL', 'PK\001\002', version, version, e['flags'],
+                self.compression, e['dostime'], e['dosdate'], e['crc'],
+                e['compressed_size'], e['size'], len(e['arcname']),
+                len(extra), 0, 0, 0, 0644 << 16, offset
+            ) + e['arcname'] + extra)
+
+        count = len(self.entries)
+        cd_size = self.offset - cd_offset
+        if count >= 0xffff or cd_offset > self.zip64_limit or cd_size > self.zip64_limit:
+            zip64_end_offset = self.offset
+            yield self._emit(struct.pack(
+                '<4sQHHLLQQQQ', 'PK\006\006', 44, 45, 45, 0, 0,
+                count, count, cd_size, cd_offset
+            ))
+            yield self._emit(struct.pack('<4sLQL', 'PK\006\007', 0, zip64_end_offset, 1))
+            count, cd_size, cd_offset = min(count, 0xffff), min(cd_size, 0xffffffff), 0xffffffff
+        yield self._emit(struct.pack(
+            '<4sHHHHLLH', 'PK\005\006', 0, 0, count, count,
+            cd_size, cd_offset, 0
+        ))
+
+
+def iter_zip(files, compression=zipfile.ZIP_DEFLATED):
+    """
+    Streams a zip archive of (arcname, path) pairs, path can also be a function
+    returning an open file. Missing files are skipped.
+    """
+    stream = ZipStream(compression)
+    for arcname, path in files:
+        if callable(path):
+            try:
+                fileobj = path()
+            except IOError:
+                continue
+            with fileobj:
+                for chunk in stream.add(arcname, fileobj):
+                    yield chunk
+        elif os.path.isfile(path):
+            for chunk in stream.add_path(arcname, path):
+                yield chunk
+    for chunk in stream.finish():
+        yield chunk
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+__author__ = 'AminHP'
+
+# python imports
+import json
+import math
+import time
+import random
+import threading
+from Queue import Queue, Empty
+from collections import defaultdict
+
+import requests
+
+# project imports
+from project.modules.seeder import SEED_PASSWORD
+
+
+PROFILES = ['login_storm', 'contest_start', 'submission_burst', 'scoreboard_polling']
+
+# a p95 this much slower than the baseline is a regression
+TOLERANCE = 1.2
+
+CODE = '#include <cstdio>\nint main() { int a, b; scanf("%d %d", &a, &b); printf("%d", a + b); }\n'
+
+
+def percentile(values, p):
+    """
+    Nearest rank percentile of sorted values.
+    """
+    if not values:
+        return 0
+    index = int(math.ceil(p / 100.0 * len(values))) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+class LoadTest(object):
+    """
+    Runs traffic profiles of a contest day against a server with the data of
+    a Seeder, and collects latencies per endpoint.
+    Profiles run one after another, each with `concurrency` clients.
+    """
+
+    def __init__(self, url, seeder, concurrency=20, duration=30):
+        self.url = url.rstrip('/') + '/api/v1/'
+        self.seeder = seeder
+        self.concurrency = concurrency
+        self.duration = duration
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+        sample = seeder.sample()
+        self.contest_id = str(sample['contest'])
+        contest = seeder.contests[sample['contest']]
+        self.problem_ids = [str(p) for p in contest['problems']]
+        self.teams = [(str(tid), seeder.teams[tid]) for tid in contest['accepted_teams']]
+        self.user_names = dict((uid, 'user%d' % i) for i, uid in enumerate(seeder.user_ids))
+        self.tokens = {}
+
+    @property
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def request(self, method, endpoint, path, token=None, **kwargs):
+        headers = {'Access-Token': token} if token else {}
+        started = time.time()
+        try:
+            response = self.session.request(method, self.url + path, headers=headers, timeout=60, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 'error'
+        elapsed = time.time() - started
+
+        name = '%s %s' % (method, endpoint)
+        with self.lock:
+            self.samples[name].append(elapsed)
+            self.statuses[name][status] += 1
+        return response
+
+    def run_tasks(self, tasks):
+        queue = Queue()
+        for task in tasks:
+            queue.put(task)
+
+        def worker():
+            while True:
+                try:
+                    task = queue.get_nowait()
+                except Empty:
+                    return
+                task()
+
+        threads = [threading.Thread(target=worker) for i in range(self.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def run_for_duration(self, task):
+        deadline = time.time() + self.duration
+        def loop():
+            while time.time() < deadline:
+                task()
+        self.run_tasks([loop] * self.concurrency)
+
+    def run(self, profiles=PROFILES):
+        # every profile needs the tokens of contestants
+        if 'login_storm' not in profiles:
+            self.login_storm()
+        for profile in profiles:
+            started = time.time()
+            getattr(self, profile)()
+            print '%s: %.1f s' % (profile, time.time() - started)
+        return self.report()
+
+    def login_storm(self):
+        """
+        All contestants log in at once.
+        """
+        def login(uid):
+            response = self.request('POST', 'user/login', 'user/login', json=dict(
+                login=self.user_names[uid], password=SEED_PASSWORD
+            ))
+            if response is not None and response.status_code == 200:
+                self.tokens[uid] = response.json()['token']
+
+        users = set()
+        for tid, team in self.teams:
+            users.update([team['owner']] + team['members'])
+        self.run_tasks([lambda uid=uid: login(uid) for uid in users])
+
+    def contest_start(self):
+        """
+        Contestants open the contest, its problems and one problem when it starts.
+        """
+        cid = self.contest_id
+        def open_contest(token):
+            self.request('GET', 'contest/<cid>', 'contest/%s' % cid, token)
+            self.request('GET', 'contest/<cid>/problem', 'contest/%s/problem' % cid, token)
+            pid = random.choice(self.problem_ids)
+            self.request('GET', 'contest/<cid>/problem/<pid>', 'contest/%s/problem/%s' % (cid, pid), token)
+        self.run_tasks([lambda token=token: open_contest(token) for token in self.tokens.values()])
+
+    def submission_burst(self):
+        """
+        Every team submits a code to each problem, as in the last minutes.
+        """
+        def submit(tid, token, pid):
+            self.request('POST', 'submission', 'submission', token, data=dict(
+                contest_id=self.contest_id, problem_id=pid, team_id=tid, prog_lang='0'
+            ), files=dict(code=('main.cpp', CODE, 'text/plain')))
+
+        tasks = []
+        for tid, team in self.teams:
+            token = self.tokens.get(team['owner'])
+            if token:
+                tasks += [lambda tid=tid, token=token, pid=pid: submit(tid, token, pid) for pid in self.problem_ids]
+        random.shuffle(tasks)
+        self.run_tasks(tasks)
+
+    def scoreboard_polling(self):
+        """
+        Contestants poll the scoreboard and their submissions for `duration` seconds.
+        """
+        cid = self.contest_id
+        tokens = self.tokens.values()
+        teams = dict((self.tokens.get(team['owner']), tid) for tid, team in self.teams)
+        def poll():
+            token = random.choice(tokens)
+            self.request('GET', 'contest/<cid>/result', 'contest/%s/result' % cid, token)
+            if token in teams:
+                self.request('GET', 'submission/contest/<cid>/team/<tid>',
+                             'submission/contest/%s/team/%s' % (cid, teams[token]), token)
+            time.sleep(random.uniform(0.5, 1.5))
+        if tokens:
+            self.run_for_duration(poll)
+
+    def report(self):
+        """
+        {endpoint: {count, statuses, p50, p95, p99, max}}, times in milliseconds.
+        """
+        result = {}
+        for name, values in self.samples.items():
+            values = sorted(values)
+            result[name] = dict(
+                count=len(values),
+                statuses=dict((str(k), v) for k, v in self.statuses[name].items()),
+                p50=percentile(values, 50) * 1000,
+                p95=percentile(values, 95) * 1000,
+                p99=percentile(values, 99) * 1000,
+                max=values[-1] * 1000
+            )
+        return result
+
+
+def print_report(report):
+    print '%-45s %7s %9s %9s %9s %9s  %s' % ('endpoint', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms', 'statuses')
+    for name, r in sorted(report.items()):
+        statuses = ' '.join('%s:%d' % item for item in sorted(r['statuses'].items()))
+        print '%-45s %7d %9.1f %9.1f %9.1f %9.1f  %s' % (name, r['count'], r['p50'], r['p95'], r['p99'], r['max'], statuses)
+
+
+def regressions(report, baseline, tolerance=TOLERANCE):
+    """
+    Endpoints whose p95 is slower than tolerance times the baseline.
+    """
+    result = []
+    for name, r in sorted(report.items()):
+        if name in baseline and r['p95'] > baseline[name]['p95'] * tolerance:
+            result.append('%s: p95 %.1f ms, baseline %.1f ms' % (name, r['p95'], baseline[name]['p95']))
+    return result
+
+
+def run(url, seeder, profiles=PROFILES, concurrency=20, duration=30, output=None, baseline=None):
+    report = LoadTest(url, seeder, concurrency, duration).run(profiles)
+    print_report(report)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if baseline:
+        with open(baseline) as f:
+            slower = regressions(report, json.load(f))
+        for line in slower:
+            print 'REGRESSION %s' % line
+        return not slower
+    return True